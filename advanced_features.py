@@ -3,21 +3,46 @@ Advanced Features untuk Pet Product Safety Analyzer
 Fitur tambahan untuk pengembangan lebih lanjut
 """
 
-import cv2
-import numpy as np
-from typing import List, Tuple, Dict
-import matplotlib.pyplot as plt
-import seaborn as sns
-from PIL import Image, ImageDraw, ImageFont
+from __future__ import annotations
+
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import List, Tuple, Dict, Iterable, Iterator, Optional
 import json
-import requests
 from datetime import datetime
+from pet_product_lazy import lazy_import
+from pet_product_metrics import METRICS
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Dependency berat baru di-import saat fitur yang memakainya pertama kali dipanggil
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# Tier denoising enhance_image_quality, urut dari yang termurah
+ENHANCEMENT_TIERS = ['fast', 'nlm_downscaled', 'nlm_full']
+
+# Estimasi awal biaya tiap tier (detik per megapiksel), dikalibrasi ulang saat berjalan
+DEFAULT_TIER_COST = {'fast': 0.005, 'nlm_downscaled': 0.4, 'nlm_full': 1.1}
+
+# Di bawah sigma noise ini denoising berat tidak sebanding dengan biayanya
+NOISE_SIGMA_LOW = 3.0
 
 class AdvancedImageProcessor:
     """Pemrosesan gambar tingkat lanjut"""
     
-    def __init__(self):
+    def __init__(self, enhance_time_budget: Optional[float] = None):
         self.yolo_model = None  # Placeholder untuk YOLO model
+        
+        # Budget latency default (detik) untuk enhance_image_quality; None = tanpa batas
+        self.enhance_time_budget = enhance_time_budget
+        self.tier_cost = dict(DEFAULT_TIER_COST)
+        self.last_enhancement = None
     
     def detect_labels_with_yolo(self, image: np.ndarray) -> List[Dict]:
         """
@@ -40,12 +65,94 @@ class AdvancedImageProcessor:
         ]
         return dummy_detections
     
-    def enhance_image_quality(self, image: np.ndarray) -> np.ndarray:
+    def estimate_noise(self, gray: np.ndarray) -> float:
+        """
+        Estimasi sigma noise (metode Immerkaer) pada crop tengah maksimal 512x512
+        Biayanya sekitar 1 ms berapa pun ukuran gambar
+        """
+        height, width = gray.shape[:2]
+        y = max(0, (height - 512) // 2)
+        x = max(0, (width - 512) // 2)
+        crop = gray[y:y + 512, x:x + 512].astype(np.float32)
+        if crop.shape[0] < 3 or crop.shape[1] < 3:
+            return 0.0
+        
+        kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+        response = np.abs(cv2.filter2D(crop, -1, kernel))[1:-1, 1:-1]
+        return float(response.sum() * np.sqrt(np.pi / 2) / (6 * response.size))
+    
+    def select_enhancement_tier(self, gray: np.ndarray, noise_sigma: float,
+                                time_budget: Optional[float] = None) -> str:
+        """
+        Pilih tier denoising: tier terberat yang dibutuhkan noise dan masih muat di budget
+        """
+        if noise_sigma < NOISE_SIGMA_LOW:
+            return 'fast'
+        if time_budget is None:
+            return 'nlm_full'
+        
+        megapixels = gray.size / 1e6
+        for tier in ('nlm_full', 'nlm_downscaled'):
+            if self.tier_cost[tier] * megapixels <= time_budget:
+                return tier
+        return 'fast'
+    
+    def _denoise(self, gray: np.ndarray, tier: str, noise_sigma: float) -> np.ndarray:
+        # Kekuatan filter NLM mengikuti estimasi noise (3 = default OpenCV)
+        strength = float(np.clip(noise_sigma, 3.0, 15.0))
+        
+        if tier == 'fast':
+            if noise_sigma < NOISE_SIGMA_LOW:
+                return cv2.medianBlur(gray, 3)
+            return cv2.bilateralFilter(gray, 5, strength * 5, 5)
+        
+        if tier == 'nlm_downscaled':
+            # NLM pada resolusi 1/2 lalu di-upsample; residual resolusi penuh hanya
+            # ditambahkan kembali jika jauh di atas noise (tepi huruf), sisanya dibuang
+            height, width = gray.shape
+            size = (max(1, width // 2), max(1, height // 2))
+            small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            denoised_small = cv2.fastNlMeansDenoising(small, None, strength)
+            upsampled = cv2.resize(denoised_small, (width, height), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+            residual = gray.astype(np.float32) - cv2.resize(small, (width, height),
+                                                             interpolation=cv2.INTER_LINEAR).astype(np.float32)
+            residual[np.abs(residual) < 2 * noise_sigma] = 0
+            return np.clip(upsampled + residual, 0, 255).astype(np.uint8)
+        
+        return cv2.fastNlMeansDenoising(gray, None, strength)
+    
+    def enhance_image_quality(self, image: np.ndarray, mode: str = 'auto',
+                              time_budget: Optional[float] = None) -> np.ndarray:
         """
         Meningkatkan kualitas gambar untuk OCR yang lebih baik
+        mode: 'auto' (dipilih dari estimasi noise + time_budget) atau salah satu ENHANCEMENT_TIERS
+        time_budget: budget latency (detik), default self.enhance_time_budget
+        Tier yang dipakai dicatat di self.last_enhancement
         """
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        if time_budget is None:
+            time_budget = self.enhance_time_budget
+        
+        start = time.perf_counter()
+        noise_sigma = self.estimate_noise(image)
+        if mode == 'auto':
+            tier = self.select_enhancement_tier(image, noise_sigma, time_budget)
+        elif mode in ENHANCEMENT_TIERS:
+            tier = mode
+        else:
+            raise ValueError(f"Mode enhancement tidak dikenal: {mode}")
+        
         # Denoising
-        denoised = cv2.fastNlMeansDenoising(image)
+        with METRICS.timer(f'enhance_{tier}'):
+            denoise_start = time.perf_counter()
+            denoised = self._denoise(image, tier, noise_sigma)
+            denoise_seconds = time.perf_counter() - denoise_start
+        
+        # Kalibrasi biaya tier (moving average) untuk pemilihan berikutnya
+        if image.size >= 250000:
+            observed = denoise_seconds / (image.size / 1e6)
+            self.tier_cost[tier] = 0.7 * self.tier_cost[tier] + 0.3 * observed
         
         # Sharpening
         kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
@@ -55,6 +162,13 @@ class AdvancedImageProcessor:
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
         enhanced = clahe.apply(sharpened)
         
+        self.last_enhancement = {
+            'tier': tier,
+            'noise_sigma': noise_sigma,
+            'time_budget': time_budget,
+            'elapsed': time.perf_counter() - start
+        }
+        METRICS.inc('enhance_tier', tier)
         return enhanced
     
     def segment_text_regions(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
@@ -75,24 +189,123 @@ class AdvancedImageProcessor:
         
         return text_regions
 
+# Lock file antar proses: fcntl di POSIX, msvcrt di Windows
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def _file_lock(lock_path: str, exclusive: bool = True):
+    """Lock antar proses berbasis file (fcntl di POSIX, msvcrt di Windows)"""
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class _AsyncRateLimiter:
+    """Pembatas laju sederhana: paling banyak rate request per detik"""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_allowed = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_allowed - now
+            self._next_allowed = max(now, self._next_allowed) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+# Ukuran blok saat membaca change log mundur dari akhir file
+LOG_TAIL_BLOCK = 4096
+
 class DatabaseManager:
     """Manajemen database bahan kimia"""
     
-    def __init__(self):
-        self.db_file = "ingredients_db.json"
+    def __init__(self, max_concurrency: int = 5, requests_per_second: float = 5.0,
+                 cache_ttl: float = 7 * 24 * 3600, negative_cache_ttl: float = 24 * 3600,
+                 cache_file: Optional[str] = None, compact_every: int = 100,
+                 db_file: str = "ingredients_db.json"):
+        self.db_file = db_file
+        
+        # Update database: append-only change log + snapshot (db_file) yang dipadatkan berkala
+        self.compact_every = compact_every
+        self.version = 0
         self.api_endpoints = {
             'pubchem': 'https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{}/JSON',
             'chemspider': 'https://www.chemspider.com/Search.asmx/SimpleSearch'
         }
+        
+        # Pencarian online: koneksi di-pool, concurrency & laju dibatasi (PubChem: maks 5 req/detik)
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self._session = None
+        self._session_lock = threading.Lock()
+        
+        # Cache TTL lokal (termasuk hasil negatif), opsional disimpan ke cache_file
+        self.cache_ttl = cache_ttl
+        self.negative_cache_ttl = negative_cache_ttl
+        self.cache_file = cache_file
+        self._lookup_cache: Dict[str, Tuple[float, Dict]] = {}
+        if cache_file:
+            self.load_lookup_cache()
     
-    def search_ingredient_online(self, ingredient_name: str) -> Dict:
+    def _get_session(self):
+        """Session requests bersama dengan connection pool"""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_concurrency)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+    
+    def _cache_key(self, ingredient_name: str) -> str:
+        return ' '.join(ingredient_name.lower().split())
+    
+    def _get_cached(self, key: str):
+        entry = self._lookup_cache.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self._lookup_cache[key]
+            METRICS.inc('cache_misses', 'online_lookup')
+            return None
+        METRICS.inc('cache_hits', 'online_lookup')
+        return entry[1]
+    
+    def _store_cached(self, key: str, result: Dict):
+        ttl = self.cache_ttl if result.get('found') else self.negative_cache_ttl
+        self._lookup_cache[key] = (time.time() + ttl, result)
+    
+    @METRICS.timed('online_lookup')
+    def _fetch_ingredient(self, ingredient_name: str) -> Dict:
         """
-        Mencari informasi bahan secara online
+        Request ke PubChem (blocking)
+        Returns: hasil pencarian; key 'cacheable' False jika error jaringan
         """
         try:
             # Contoh pencarian di PubChem
-            url = self.api_endpoints['pubchem'].format(ingredient_name)
-            response = requests.get(url, timeout=10)
+            url = self.api_endpoints['pubchem'].format(quote(ingredient_name, safe=''))
+            response = self._get_session().get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -102,39 +315,525 @@ class DatabaseManager:
                     'data': data,
                     'timestamp': datetime.now().isoformat()
                 }
+            # 404 dan respon non-200 lainnya dianggap hasil negatif, kecuali rate limit / server error
+            return {'found': False, 'cacheable': response.status_code < 500 and response.status_code != 429}
         except Exception as e:
             print(f"Error searching online: {e}")
+            METRICS.inc('errors', 'online_lookup')
         
-        return {'found': False}
+        return {'found': False, 'cacheable': False}
     
-    def update_database_from_research(self, research_data: Dict):
+    def search_ingredient_online(self, ingredient_name: str) -> Dict:
         """
-        Update database berdasarkan penelitian terbaru
+        Mencari informasi bahan secara online
+        """
+        key = self._cache_key(ingredient_name)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+        
+        result = self._fetch_ingredient(ingredient_name)
+        if result.pop('cacheable', True):
+            self._store_cached(key, result)
+        return result
+    
+    async def search_ingredients_online_async(self, ingredient_names: List[str]) -> Dict[str, Dict]:
+        """
+        Pencarian online untuk banyak bahan sekaligus
+        Nama diduplikasi dulu, cache dicek, lalu request berjalan paralel
+        dengan batas concurrency dan laju
+        Returns: nama bahan (sesuai input) -> hasil
+        """
+        keys = {}
+        for name in ingredient_names:
+            keys.setdefault(self._cache_key(name), name)
+        
+        results = {}
+        pending = []
+        for key, name in keys.items():
+            cached = self._get_cached(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending.append((key, name))
+        
+        if pending:
+            loop = asyncio.get_running_loop()
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            limiter = _AsyncRateLimiter(self.requests_per_second)
+            
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                async def fetch(key: str, name: str):
+                    async with semaphore:
+                        await limiter.acquire()
+                        result = await loop.run_in_executor(executor, self._fetch_ingredient, name)
+                    if result.pop('cacheable', True):
+                        self._store_cached(key, result)
+                    results[key] = result
+                
+                await asyncio.gather(*(fetch(key, name) for key, name in pending))
+            
+            if self.cache_file:
+                self.save_lookup_cache()
+        
+        return {name: results[self._cache_key(name)] for name in ingredient_names}
+    
+    def search_ingredients_online(self, ingredient_names: List[str]) -> Dict[str, Dict]:
+        """Versi sinkron dari search_ingredients_online_async"""
+        return asyncio.run(self.search_ingredients_online_async(ingredient_names))
+    
+    def save_lookup_cache(self):
+        """Simpan cache pencarian (yang belum kedaluwarsa) ke cache_file"""
+        now = time.time()
+        entries = {key: entry for key, entry in self._lookup_cache.items() if entry[0] >= now}
+        tmp_path = self.cache_file + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            print(f"Error saving lookup cache: {e}")
+    
+    def load_lookup_cache(self):
+        """Load cache pencarian dari cache_file"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            now = time.time()
+            self._lookup_cache = {key: tuple(entry) for key, entry in entries.items() if entry[0] >= now}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading lookup cache: {e}")
+    
+    @property
+    def log_file(self) -> str:
+        return self.db_file + ".log"
+    
+    @property
+    def lock_file(self) -> str:
+        return self.db_file + ".lock"
+    
+    def _merge_research(self, current_db: Dict, research_data: Dict):
+        """Merge data penelitian ke database (in-place)"""
+        for category, ingredients in research_data.items():
+            if category in current_db:
+                current_db[category].update(ingredients)
+            else:
+                current_db[category] = dict(ingredients)
+    
+    def _read_state(self) -> Tuple[int, Dict, int]:
+        """
+        Baca snapshot + replay change log (harus dipanggil di dalam lock)
+        Returns: (versi, database, jumlah entry di log)
         """
         try:
             with open(self.db_file, 'r', encoding='utf-8') as f:
                 current_db = json.load(f)
+        except FileNotFoundError:
+            current_db = {}
+        
+        version = 0
+        entries = 0
+        try:
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # Baris terakhir belum selesai ditulis
+                    record = json.loads(line)
+                    if 'base_version' in record:
+                        version = record['base_version']
+                        continue
+                    # Replay idempoten: log bisa berisi delta yang sudah masuk snapshot
+                    self._merge_research(current_db, record['delta'])
+                    version = record['version']
+                    entries += 1
+        except FileNotFoundError:
+            pass
+        
+        return version, current_db, entries
+    
+    def load_database(self) -> Tuple[int, Dict]:
+        """
+        Baca database terbaru secara konsisten
+        Returns: (versi, database)
+        """
+        with _file_lock(self.lock_file, exclusive=False):
+            version, current_db, _ = self._read_state()
+        self.version = version
+        return version, current_db
+    
+    def _last_log_record(self) -> Tuple[Optional[Dict], int]:
+        """
+        Record lengkap terakhir di change log, dibaca mundur dari akhir file
+        (biaya sebanding ukuran record terakhir, bukan ukuran log)
+        Returns: (record atau None, offset akhir record tersebut)
+        """
+        try:
+            f = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            return None, 0
+        with f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            tail = b''
+            while position > 0:
+                step = min(LOG_TAIL_BLOCK, position)
+                position -= step
+                f.seek(position)
+                tail = f.read(step) + tail
+                # Butuh newline penutup record terakhir dan newline sebelumnya (atau awal file)
+                end = tail.rfind(b"\n")
+                if end < 0:
+                    continue
+                start = tail.rfind(b"\n", 0, end)
+                if start >= 0 or position == 0:
+                    line = tail[start + 1:end + 1]
+                    return json.loads(line.decode('utf-8')), position + end + 1
+            return None, 0
+    
+    def _current_version(self) -> Tuple[int, int]:
+        """
+        Versi terakhir dari record terakhir log (tanpa membaca delta sebelumnya)
+        Returns: (versi, offset akhir record lengkap terakhir)
+        """
+        record, complete_end = self._last_log_record()
+        if record is None:
+            return 0, complete_end
+        return record.get('base_version', record.get('version', 0)), complete_end
+    
+    @METRICS.timed('database_update')
+    def update_database_from_research(self, research_data: Dict) -> Optional[int]:
+        """
+        Update database berdasarkan penelitian terbaru
+        Delta ditambahkan ke change log (biaya sebanding ukuran delta);
+        log dipadatkan ke snapshot setiap compact_every update
+        Returns: versi database baru, atau None jika gagal
+        """
+        try:
+            with _file_lock(self.lock_file):
+                version, complete_end = self._current_version()
+                version += 1
+                # Buang sisa baris yang tidak selesai ditulis (crash) agar record baru tidak menempel
+                if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > complete_end:
+                    with open(self.log_file, 'r+b') as f:
+                        f.truncate(complete_end)
+                record = {
+                    'version': version,
+                    'timestamp': datetime.now().isoformat(),
+                    'delta': research_data
+                }
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                if version % self.compact_every == 0:
+                    self._compact_locked()
             
-            # Merge new research data
-            for category, ingredients in research_data.items():
-                if category in current_db:
-                    current_db[category].update(ingredients)
-                else:
-                    current_db[category] = ingredients
-            
-            # Save updated database
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(current_db, f, indent=2, ensure_ascii=False)
-            
+            self.version = version
             print("Database updated successfully")
+            return version
             
         except Exception as e:
             print(f"Error updating database: {e}")
+            METRICS.inc('errors', 'database_update')
+            return None
+    
+    def compact_database(self):
+        """Padatkan change log ke snapshot db_file"""
+        with _file_lock(self.lock_file):
+            self._compact_locked()
+    
+    def _compact_locked(self):
+        """Tulis snapshot baru lalu kosongkan log (keduanya via rename atomik)"""
+        version, current_db, _ = self._read_state()
+        
+        tmp_path = self.db_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(current_db, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_file)
+        
+        # Jika crash sebelum langkah ini, replay log lama di atas snapshot baru tetap menghasilkan state yang sama
+        tmp_path = self.log_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'base_version': version}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_file)
+
+def load_json_database(filename: str) -> Dict:
+    """
+    Baca file JSON database bahan; jika file dikelola DatabaseManager (ada change log),
+    snapshot + replay log dibaca di bawah lock yang sama dengan writer
+    """
+    if os.path.exists(filename + ".log"):
+        return DatabaseManager(db_file=filename).load_database()[1]
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class SQLiteIngredientStore:
+    """
+    Store bahan berbasis SQLite untuk database besar
+    - Lookup alias lewat index (tabel aliases)
+    - Pencarian substring/prefix lewat FTS5 (tokenizer trigram)
+    Data dibaca dari disk per query, tidak dimuat penuh ke memori
+    Bisa dipakai langsung sebagai sumber IngredientAnalyzer(ingredient_store=...)
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY,
+            canonical_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            level TEXT,
+            description TEXT,
+            inci_name TEXT
+        );
+        CREATE TABLE IF NOT EXISTS aliases (
+            alias TEXT PRIMARY KEY,
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients(id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS animal_notes (
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients(id),
+            species TEXT NOT NULL,
+            note TEXT NOT NULL,
+            PRIMARY KEY (ingredient_id, species)
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS alias_fts USING fts5(
+            alias, ingredient_id UNINDEXED, tokenize='trigram'
+        );
+    """
+    
+    # Jumlah kondisi rentang alias per query match_ingredient (batas parameter SQLite)
+    MATCH_BATCH_CONDITIONS = 200
+    
+    def __init__(self, db_path: str = "ingredients.sqlite"):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.executescript(self.SCHEMA)
+    
+    def __getstate__(self):
+        # Koneksi SQLite tidak bisa di-pickle; setiap worker membuka koneksi sendiri
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Koneksi per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+    
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM ingredients").fetchone()[0]
+    
+    def _insert_ingredient(self, connection: sqlite3.Connection, canonical_id: str, category: str,
+                           level: Optional[str], description: str, aliases: List[str],
+                           animal_notes: Dict[str, str], inci_name: Optional[str] = None) -> int:
+        name = canonical_id.replace('_', ' ').lower()
+        connection.execute(
+            "INSERT INTO ingredients (canonical_id, name, category, level, description, inci_name) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(canonical_id) DO UPDATE SET category=excluded.category, "
+            "level=COALESCE(excluded.level, level), "
+            "description=excluded.description, inci_name=COALESCE(excluded.inci_name, inci_name)",
+            (canonical_id, name, category, level, description, inci_name)
+        )
+        ingredient_id = connection.execute(
+            "SELECT id FROM ingredients WHERE canonical_id = ?", (canonical_id,)
+        ).fetchone()[0]
+        
+        alias_rows = []
+        for alias in [name] + list(aliases) + ([inci_name] if inci_name else []):
+            alias = ' '.join(alias.lower().split())
+            if alias:
+                alias_rows.append((alias, ingredient_id))
+        for alias, alias_ingredient_id in alias_rows:
+            cursor = connection.execute("INSERT OR IGNORE INTO aliases (alias, ingredient_id) VALUES (?, ?)",
+                                        (alias, alias_ingredient_id))
+            if cursor.rowcount:
+                connection.execute("INSERT INTO alias_fts (alias, ingredient_id) VALUES (?, ?)",
+                                   (alias, alias_ingredient_id))
+        connection.executemany(
+            "INSERT OR REPLACE INTO animal_notes (ingredient_id, species, note) VALUES (?, ?, ?)",
+            [(ingredient_id, self._normalize_species(species), note) for species, note in animal_notes.items()]
+        )
+        return ingredient_id
+    
+    def import_json(self, filename: str) -> int:
+        """
+        Bulk import dari file JSON yang sudah ada:
+        - format ingredients_database.json (aliases, danger_level, animal_specific)
+        - format sederhana {kategori: {nama: deskripsi}} (ingredients_db.json / kamus bawaan)
+        Returns: jumlah bahan yang diimport
+        """
+        try:
+            data = load_json_database(filename)
+        except Exception as e:
+            print(f"Error loading database: {e}")
+            return 0
+        return self.import_data(data)
+    
+    def import_data(self, data: Dict) -> int:
+        """Bulk import dari dictionary (lihat import_json)"""
+        imported = 0
+        connection = self._connect()
+        with connection:
+            for section, ingredients in data.items():
+                if not isinstance(ingredients, dict):
+                    continue
+                category = self._section_category(section)
+                if category is None:
+                    continue
+                level_field = 'danger_level' if category == 'dangerous' else 'safety_level'
+                text_field = 'reason' if category == 'dangerous' else 'benefits'
+                
+                for canonical_id, entry in ingredients.items():
+                    if isinstance(entry, str):
+                        # Format sederhana: nama -> deskripsi
+                        self._insert_ingredient(connection, '_'.join(canonical_id.lower().split()),
+                                                category, None, entry, [], {})
+                    elif isinstance(entry, dict):
+                        self._insert_ingredient(
+                            connection, canonical_id, category, entry.get(level_field),
+                            entry.get(text_field, entry.get('reason', entry.get('benefit', ''))),
+                            entry.get('aliases', []), entry.get('animal_specific', {}),
+                            inci_name=entry.get('inci_name')
+                        )
+                    else:
+                        continue
+                    imported += 1
+        print(f"{imported} bahan diimport ke {self.db_path}")
+        return imported
+    
+    def _normalize_species(self, species: str) -> str:
+        """'cats' -> 'cat' (sama dengan knowledge base)"""
+        species = species.strip().lower()
+        if species != 'all' and species.endswith('s'):
+            species = species[:-1]
+        return species
+    
+    def _section_category(self, section: str) -> Optional[str]:
+        section = section.lower()
+        if section.startswith('dangerous'):
+            return 'dangerous'
+        if section.startswith('safe'):
+            return 'safe'
+        return None
+    
+    def lookup_alias(self, alias: str) -> Optional[Dict]:
+        """Lookup exact alias (index primary key)"""
+        row = self._connect().execute(
+            "SELECT i.canonical_id, i.name, i.category, i.level, i.description "
+            "FROM aliases a JOIN ingredients i ON i.id = a.ingredient_id WHERE a.alias = ?",
+            (' '.join(alias.lower().split()),)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'name', 'category', 'level', 'description'), row))
+    
+    def search(self, query: str, limit: int = 20, prefix: bool = False) -> List[Dict]:
+        """
+        Pencarian alias berdasarkan substring (default) atau prefix lewat FTS5
+        Query minimal 3 karakter (batas tokenizer trigram)
+        """
+        query = ' '.join(query.lower().split())
+        if len(query) < 3:
+            return []
+        # Phrase query pada tokenizer trigram = pencarian substring
+        phrase = '"' + query.replace('"', '""') + '"'
+        rows = self._connect().execute(
+            "SELECT f.alias, i.canonical_id, i.category FROM alias_fts f "
+            "JOIN ingredients i ON i.id = f.ingredient_id "
+            "WHERE alias_fts MATCH ? AND (? = 0 OR f.alias LIKE ? || '%') LIMIT ?",
+            (phrase, int(prefix), query, limit)
+        ).fetchall()
+        return [{'alias': alias, 'id': canonical_id, 'category': category} for alias, canonical_id, category in rows]
+    
+    def animal_notes_for(self, canonical_id: str) -> Dict[str, str]:
+        rows = self._connect().execute(
+            "SELECT n.species, n.note FROM animal_notes n JOIN ingredients i ON i.id = n.ingredient_id "
+            "WHERE i.canonical_id = ?", (canonical_id,)
+        ).fetchall()
+        return dict(rows)
+    
+    def match_ingredient(self, ingredient: str) -> List[Tuple]:
+        """
+        Entry yang cocok untuk satu ingredient: alias yang muncul di mana saja di dalam
+        teks (substring, sama dengan automaton IngredientAnalyzer), satu entry per bahan,
+        urut dangerous dulu; format sama dengan entry matcher IngredientAnalyzer
+        """
+        text = ' '.join(ingredient.lower().split())
+        if not text:
+            return []
+        
+        # Alias yang dimulai di posisi i adalah prefix dari text[i:], sehingga berada di
+        # rentang [text[i:i+3], text[i:]] pada index alias (alias < 3 karakter dicek exact)
+        conditions = []
+        short_aliases = set()
+        for i in range(len(text)):
+            rest = text[i:]
+            short_aliases.update(rest[:size] for size in (1, 2) if size <= len(rest))
+            if len(rest) >= 3:
+                conditions.append(("a.alias BETWEEN ? AND ?", (rest[:3], rest)))
+        conditions.append((f"a.alias IN ({','.join('?' * len(short_aliases))})", tuple(short_aliases)))
+        
+        rows = []
+        connection = self._connect()
+        for start in range(0, len(conditions), self.MATCH_BATCH_CONDITIONS):
+            batch = conditions[start:start + self.MATCH_BATCH_CONDITIONS]
+            rows.extend(connection.execute(
+                "SELECT a.alias, i.id, i.canonical_id, i.name, i.category, i.level, i.description "
+                "FROM aliases a JOIN ingredients i ON i.id = a.ingredient_id "
+                f"WHERE {' OR '.join(condition for condition, _ in batch)}",
+                [param for _, batch_params in batch for param in batch_params]
+            ).fetchall())
+        
+        # Verifikasi substring, lalu satu entry per bahan (alias terpanjang)
+        best = {}
+        for alias, row_id, canonical_id, name, category, level, description in rows:
+            if alias not in text:
+                continue
+            current = best.get(row_id)
+            if current is None or len(alias) > len(current[0]):
+                best[row_id] = (alias, row_id, canonical_id, name, category, level, description)
+        
+        entries = []
+        for alias, row_id, canonical_id, name, category, level, description in sorted(
+                best.values(), key=lambda row: (row[4] == 'safe', row[1])):
+            extra = {'id': canonical_id}
+            if level:
+                extra['danger_level' if category == 'dangerous' else 'safety_level'] = level
+            entries.append((category, alias, name.title(), description, extra))
+        return entries
+
+# Severity peringatan (kode dipakai di matriks risiko AnimalSpecificAnalyzer)
+SEVERITY_LEVELS = ['none', 'low', 'medium', 'high', 'critical']
+DANGER_LEVEL_SEVERITY = {'low': 1, 'medium': 2, 'high': 3, 'very_high': 4}
 
 class AnimalSpecificAnalyzer:
     """Analisis spesifik berdasarkan jenis hewan"""
     
-    def __init__(self):
+    def __init__(self, knowledge_base=None):
         self.animal_profiles = {
             'cat': {
                 'metabolism': 'slow',
@@ -161,121 +860,321 @@ class AnimalSpecificAnalyzer:
                 'toxic_compounds': ['teflon', 'aerosols', 'fragrances']
             }
         }
+        
+        # Data animal_specific dari knowledge base (opsional, mis. load_knowledge_base());
+        # tanpa knowledge base hanya toxic_compounds tiap profil yang dipakai
+        self.knowledge_base = knowledge_base
+        self._build_risk_matrix()
     
-    def analyze_for_specific_animal(self, ingredients: List[str], animal_type: str) -> Dict:
+    def _build_risk_matrix(self):
         """
-        Analisis keamanan untuk jenis hewan tertentu
+        Matriks risiko pola x spesies untuk evaluasi semua profil dalam satu scan
+        - toxic_compounds tiap profil (severity critical)
+        - alias bahan berbahaya di knowledge base yang punya catatan untuk spesies tsb
         """
-        if animal_type not in self.animal_profiles:
-            return {'error': f'Animal type {animal_type} not supported'}
+        from pet_product_utils import IngredientMatcher, CATEGORY_DANGEROUS, DANGER_LEVELS
         
-        profile = self.animal_profiles[animal_type]
-        results = {
-            'animal_type': animal_type,
-            'specific_warnings': [],
-            'safety_score': 0,
-            'recommendations': []
-        }
+        self.species = list(self.animal_profiles.keys())
+        species_index = {species: i for i, species in enumerate(self.species)}
+        patterns = []
+        pattern_index = {}
+        rows = []
+        messages = {}
         
-        dangerous_count = 0
-        safe_count = 0
+        def add_pattern(pattern: str) -> int:
+            if pattern not in pattern_index:
+                pattern_index[pattern] = len(patterns)
+                patterns.append(pattern)
+                rows.append([0] * len(self.species))
+            return pattern_index[pattern]
         
+        for animal_type, profile in self.animal_profiles.items():
+            column = species_index[animal_type]
+            for toxic in profile['toxic_compounds']:
+                # 'propylene_glycol' juga dicocokkan sebagai 'propylene glycol'
+                for variant in {toxic, toxic.replace('_', ' ')}:
+                    row = add_pattern(variant)
+                    rows[row][column] = SEVERITY_LEVELS.index('critical')
+                    messages[(row, column)] = f'Sangat berbahaya untuk {animal_type}'
+        
+        kb = self.knowledge_base
+        if kb is not None:
+            for index in range(len(kb)):
+                if kb.categories[index] != CATEGORY_DANGEROUS:
+                    continue
+                notes = kb.notes_for(index)
+                severity = DANGER_LEVEL_SEVERITY[DANGER_LEVELS[kb.levels[index]]]
+                for animal_type in self.species:
+                    note = notes.get(animal_type, notes.get('all'))
+                    if note is None:
+                        continue
+                    column = species_index[animal_type]
+                    for alias in kb.aliases[index]:
+                        row = add_pattern(alias)
+                        if rows[row][column] == 0:
+                            rows[row][column] = severity
+                            messages[(row, column)] = f'{kb.names[index].title()}: {note}'
+        
+        self.risk_patterns = patterns
+        self.risk_matrix = np.array(rows, dtype=np.int8).reshape(len(patterns), len(self.species))
+        self._risk_messages = messages
+        self._risk_matcher = IngredientMatcher(patterns)
+        
+        # Versi sparse dari matriks per baris: [(kolom, severity), ...] untuk scan cepat
+        self._row_risks = [
+            [(column, severity) for column, severity in enumerate(row) if severity > 0] for row in rows
+        ]
+    
+    def analyze_for_specific_animal(self, ingredients: List[str], animal_type: str) -> Dict:
+        """
+        Analisis keamanan untuk jenis hewan tertentu
+        (satu kolom dari analyze_for_all_animals, sehingga hasil keduanya selalu sama)
+        """
+        return self.analyze_for_all_animals(ingredients, [animal_type])[animal_type]
+
+    def analyze_for_all_animals(self, ingredients: List[str], animal_types: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Analisis keamanan untuk semua jenis hewan dengan satu scan bahan
+        Returns: jenis hewan -> hasil (format sama dengan analyze_for_specific_animal)
+        """
+        if animal_types is None:
+            animal_types = self.species
+        columns = []
+        results = {}
+        for animal_type in animal_types:
+            if animal_type not in self.animal_profiles:
+                results[animal_type] = {'error': f'Animal type {animal_type} not supported'}
+                continue
+            columns.append(self.species.index(animal_type))
+            results[animal_type] = {
+                'animal_type': animal_type,
+                'specific_warnings': [],
+                'safety_score': 0,
+                'recommendations': []
+            }
+        
+        dangerous_counts = [0] * len(self.species)
+        selected = set(columns)
         for ingredient in ingredients:
-            ingredient_lower = ingredient.lower()
+            # Risiko tertinggi untuk tiap spesies (satu peringatan per bahan)
+            worst = {}
+            for row in self._risk_matcher.find(ingredient.lower()):
+                for column, severity in self._row_risks[row]:
+                    if column in selected and (column not in worst or severity > worst[column][0]):
+                        worst[column] = (severity, row)
             
-            # Check against animal-specific toxic compounds
-            for toxic in profile['toxic_compounds']:
-                if toxic in ingredient_lower:
-                    results['specific_warnings'].append({
-                        'ingredient': ingredient,
-                        'warning': f'Sangat berbahaya untuk {animal_type}',
-                        'severity': 'critical'
-                    })
-                    dangerous_count += 1
-                    break
-            else:
-                safe_count += 1
+            for column, (severity, row) in worst.items():
+                results[self.species[column]]['specific_warnings'].append({
+                    'ingredient': ingredient,
+                    'warning': self._risk_messages[(row, column)],
+                    'severity': SEVERITY_LEVELS[severity]
+                })
+                dangerous_counts[column] += 1
         
-        # Calculate safety score
         total_ingredients = len(ingredients)
-        if total_ingredients > 0:
-            results['safety_score'] = (safe_count / total_ingredients) * 100
-        
-        # Generate recommendations
-        if results['safety_score'] < 50:
-            results['recommendations'].append(f'Tidak disarankan untuk {animal_type}')
-        elif results['safety_score'] < 80:
-            results['recommendations'].append(f'Gunakan dengan hati-hati pada {animal_type}')
-        else:
-            results['recommendations'].append(f'Relatif aman untuk {animal_type}')
+        for column in columns:
+            animal_type = self.species[column]
+            result = results[animal_type]
+            if total_ingredients > 0:
+                result['safety_score'] = ((total_ingredients - dangerous_counts[column]) / total_ingredients) * 100
+            
+            # Generate recommendations
+            if result['safety_score'] < 50:
+                result['recommendations'].append(f'Tidak disarankan untuk {animal_type}')
+            elif result['safety_score'] < 80:
+                result['recommendations'].append(f'Gunakan dengan hati-hati pada {animal_type}')
+            else:
+                result['recommendations'].append(f'Relatif aman untuk {animal_type}')
         
         return results
 
+# Kategori dan warna chart laporan
+REPORT_CATEGORIES = ['Dangerous', 'Safe', 'Unknown']
+REPORT_COLORS = ['#ff6b6b', '#4ecdc4', '#ffd93d']
+STATUS_COLORS = {'safe': '#4ecdc4', 'caution': '#ffa94d', 'dangerous': '#ff6b6b', 'unknown': '#ffd93d'}
+
+# Batas baris tabel produk bermasalah di laporan gabungan
+SUMMARY_MAX_ROWS = 500
+
+class BatchReportSummary:
+    """Agregasi hasil batch untuk laporan gabungan (dihitung bertahap, memori kecil)"""
+    
+    def __init__(self):
+        self.products = 0
+        self.errors = 0
+        self.statuses = {}
+        self.category_totals = {'dangerous': 0, 'safe': 0, 'unknown': 0}
+        self.dangerous_counts = {}
+        self.dangerous_per_product = []
+        self.flagged = []
+    
+    def add(self, name: str, result: Dict):
+        if 'error' in result:
+            self.errors += 1
+            return
+        from pet_product_utils import IngredientAnalyzer
+        
+        analysis = result.get('analysis', result)
+        recommendation = result.get('recommendation') or IngredientAnalyzer.get_recommendation(analysis)
+        status = recommendation['status']
+        dangerous_names = sorted({entry['name'] for entry in analysis.get('dangerous', [])})
+        
+        self.products += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for category in self.category_totals:
+            self.category_totals[category] += len(analysis.get(category, []))
+        for ingredient in dangerous_names:
+            self.dangerous_counts[ingredient] = self.dangerous_counts.get(ingredient, 0) + 1
+        self.dangerous_per_product.append(len(dangerous_names))
+        if dangerous_names:
+            self.flagged.append((name, status, ', '.join(dangerous_names)))
+    
+    def top_dangerous(self, limit: int = 10) -> List[Tuple[str, int]]:
+        return sorted(self.dangerous_counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+# Generator per worker process untuk render laporan batch (canvas + style dibuat sekali per proses)
+_report_worker_state = {}
+
+def _init_report_worker(chart_dpi: int, formats: Tuple[str, ...]):
+    _report_worker_state['generator'] = ReportGenerator(chart_dpi=chart_dpi)
+    _report_worker_state['formats'] = formats
+
+def _render_reports_in_worker(items: List[Tuple[str, Dict]], output_dir: str) -> int:
+    generator = _report_worker_state['generator']
+    formats = _report_worker_state['formats']
+    return sum(generator.render_product_report(result, output_dir, name, formats) for name, result in items)
+
 class ReportGenerator:
     """Generator laporan analisis"""
     
-    def __init__(self):
+    def __init__(self, chart_dpi: int = 300):
         self.template_path = "report_template.html"
+        self.chart_dpi = chart_dpi
+        
+        # Canvas Agg (tanpa state global pyplot) dan style PDF dibuat sekali lalu dipakai ulang
+        self._figure = None
+        self._axes = None
+        self._chart_kind = None
+        self._pdf_kit = None
     
-    def generate_pdf_report(self, analysis_results: Dict, output_path: str = "analysis_report.pdf"):
+    def _get_axes(self, kind: str, dynamic: Tuple[int, ...] = (0, 1, 2, 3)):
         """
-        Generate laporan PDF
+        Ambil figure 2x2 yang dipakai ulang
+        Jika jenis chart sama dengan sebelumnya, hanya axes di dynamic yang dikosongkan
+        Returns: (axes, True jika semua axes baru dikosongkan)
         """
-        try:
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        if self._figure is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            
+            self._figure = Figure(figsize=(10, 8))
+            FigureCanvasAgg(self._figure)
+            self._axes = self._figure.subplots(2, 2).flatten()
+        
+        fresh = self._chart_kind != kind
+        self._chart_kind = kind
+        for index, ax in enumerate(self._axes):
+            if fresh or index in dynamic:
+                ax.clear()
+        return self._axes, fresh
+    
+    def _save_figure(self, save_path: str, dpi: int, tight: bool = True):
+        if tight:
+            self._figure.tight_layout()
+            self._figure.savefig(save_path, dpi=dpi, bbox_inches='tight')
+        else:
+            # Layout tetap untuk render batch: tight_layout + bbox 'tight' menggandakan biaya draw
+            self._figure.subplots_adjust(left=0.08, right=0.97, bottom=0.07, top=0.94, wspace=0.3, hspace=0.35)
+            self._figure.savefig(save_path, dpi=dpi)
+    
+    def _get_pdf_kit(self) -> Dict:
+        """Import ReportLab dan bangun style PDF sekali saja"""
+        if self._pdf_kit is None:
+            from reportlab.lib.pagesizes import A4
+            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
             from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
             from reportlab.lib.units import inch
             from reportlab.lib import colors
             
-            # Create PDF document
-            doc = SimpleDocTemplate(output_path, pagesize=A4)
             styles = getSampleStyleSheet()
-            story = []
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.darkblue,
-                alignment=1  # Center alignment
-            )
-            story.append(Paragraph("Pet Product Safety Analysis Report", title_style))
-            story.append(Spacer(1, 0.5*inch))
-            
-            # Analysis Summary
-            summary_data = [
-                ['Category', 'Count', 'Percentage'],
-                ['Dangerous Ingredients', len(analysis_results.get('dangerous', [])), ''],
-                ['Safe Ingredients', len(analysis_results.get('safe', [])), ''],
-                ['Unknown Ingredients', len(analysis_results.get('unknown', [])), '']
-            ]
-            
-            summary_table = Table(summary_data)
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            story.append(summary_table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Detailed Analysis
-            if analysis_results.get('dangerous'):
-                story.append(Paragraph("Dangerous Ingredients Found:", styles['Heading2']))
-                for ingredient in analysis_results['dangerous']:
-                    story.append(Paragraph(f"• {ingredient['name']}: {ingredient['reason']}", styles['Normal']))
-                story.append(Spacer(1, 0.2*inch))
-            
-            # Build PDF
-            doc.build(story)
+            self._pdf_kit = {
+                'A4': A4, 'SimpleDocTemplate': SimpleDocTemplate, 'Paragraph': Paragraph,
+                'Spacer': Spacer, 'Table': Table, 'Image': Image, 'inch': inch,
+                'styles': styles,
+                'title': ParagraphStyle(
+                    'CustomTitle',
+                    parent=styles['Heading1'],
+                    fontSize=24,
+                    textColor=colors.darkblue,
+                    alignment=1  # Center alignment
+                ),
+                'table': TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 14),
+                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+                ]),
+                'list_table': TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, -1), 8),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+                ])
+            }
+        return self._pdf_kit
+    
+    def _build_report_story(self, analysis_results: Dict, title: str = "Pet Product Safety Analysis Report",
+                            chart_path: Optional[str] = None) -> List:
+        kit = self._get_pdf_kit()
+        Paragraph, Spacer, inch = kit['Paragraph'], kit['Spacer'], kit['inch']
+        styles = kit['styles']
+        story = []
+        
+        # Title
+        story.append(Paragraph(title, kit['title']))
+        story.append(Spacer(1, 0.5*inch))
+        
+        # Analysis Summary
+        summary_data = [
+            ['Category', 'Count', 'Percentage'],
+            ['Dangerous Ingredients', len(analysis_results.get('dangerous', [])), ''],
+            ['Safe Ingredients', len(analysis_results.get('safe', [])), ''],
+            ['Unknown Ingredients', len(analysis_results.get('unknown', [])), '']
+        ]
+        
+        summary_table = kit['Table'](summary_data)
+        summary_table.setStyle(kit['table'])
+        
+        story.append(summary_table)
+        story.append(Spacer(1, 0.3*inch))
+        
+        # Detailed Analysis
+        if analysis_results.get('dangerous'):
+            story.append(Paragraph("Dangerous Ingredients Found:", styles['Heading2']))
+            for ingredient in analysis_results['dangerous']:
+                story.append(Paragraph(f"• {ingredient['name']}: {ingredient['reason']}", styles['Normal']))
+            story.append(Spacer(1, 0.2*inch))
+        
+        if chart_path:
+            story.append(kit['Image'](chart_path, width=6*inch, height=4.8*inch))
+        return story
+    
+    def _write_pdf(self, story: List, output_path: str):
+        kit = self._get_pdf_kit()
+        kit['SimpleDocTemplate'](output_path, pagesize=kit['A4']).build(story)
+    
+    def generate_pdf_report(self, analysis_results: Dict, output_path: str = "analysis_report.pdf"):
+        """
+        Generate laporan PDF
+        """
+        try:
+            self._write_pdf(self._build_report_story(analysis_results), output_path)
             print(f"PDF report generated: {output_path}")
             
         except ImportError:
@@ -283,108 +1182,354 @@ class ReportGenerator:
         except Exception as e:
             print(f"Error generating PDF report: {e}")
     
+    def _draw_analysis_chart(self, analysis_results: Dict):
+        # Data untuk pie chart
+        values = [
+            len(analysis_results.get('dangerous', [])),
+            len(analysis_results.get('safe', [])),
+            len(analysis_results.get('unknown', []))
+        ]
+        # Panel skor dan tren statis: cukup digambar sekali selama canvas dipakai ulang
+        (pie_ax, bar_ax, score_ax, trend_ax), fresh = self._get_axes('analysis', dynamic=(0, 1))
+        
+        # Main pie chart
+        if sum(values):
+            pie_ax.pie(values, labels=REPORT_CATEGORIES, colors=REPORT_COLORS, autopct='%1.1f%%', startangle=90)
+        pie_ax.set_title('Ingredient Safety Distribution')
+        
+        # Bar chart
+        bar_ax.bar(REPORT_CATEGORIES, values, color=REPORT_COLORS)
+        bar_ax.set_title('Ingredient Count by Category')
+        bar_ax.set_ylabel('Number of Ingredients')
+        
+        if not fresh:
+            return
+        
+        # Safety score gauge (placeholder)
+        safety_score = 75  # Placeholder
+        score_ax.bar(['Safety Score'], [safety_score], color='green' if safety_score > 70 else 'orange' if safety_score > 40 else 'red')
+        score_ax.set_ylim(0, 100)
+        score_ax.set_title('Overall Safety Score')
+        score_ax.set_ylabel('Score (%)')
+        
+        # Timeline or trends (placeholder)
+        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May']
+        safety_trend = [65, 70, 68, 75, 78]  # Placeholder data
+        trend_ax.plot(months, safety_trend, marker='o', color='blue')
+        trend_ax.set_title('Safety Trend Over Time')
+        trend_ax.set_ylabel('Safety Score')
+    
     def generate_visualization(self, analysis_results: Dict, save_path: str = "analysis_chart.png"):
         """
         Generate visualisasi hasil analisis
         """
         try:
-            # Data untuk pie chart
-            categories = ['Dangerous', 'Safe', 'Unknown']
-            values = [
-                len(analysis_results.get('dangerous', [])),
-                len(analysis_results.get('safe', [])),
-                len(analysis_results.get('unknown', []))
-            ]
-            
-            colors = ['#ff6b6b', '#4ecdc4', '#ffd93d']
+            self._draw_analysis_chart(analysis_results)
+            self._save_figure(save_path, self.chart_dpi)
             
-            # Create pie chart
-            plt.figure(figsize=(10, 8))
-            
-            # Main pie chart
-            plt.subplot(2, 2, 1)
-            plt.pie(values, labels=categories, colors=colors, autopct='%1.1f%%', startangle=90)
-            plt.title('Ingredient Safety Distribution')
+            print(f"Visualization saved: {save_path}")
             
-            # Bar chart
-            plt.subplot(2, 2, 2)
-            plt.bar(categories, values, color=colors)
-            plt.title('Ingredient Count by Category')
-            plt.ylabel('Number of Ingredients')
+        except Exception as e:
+            print(f"Error generating visualization: {e}")
+    
+    def render_product_report(self, result: Dict, output_dir: str, name: str,
+                              formats: Tuple[str, ...] = ('pdf', 'png')) -> int:
+        """
+        Render laporan satu produk dari hasil batch (chart PNG dan/atau PDF)
+        Returns: 1 jika berhasil, 0 jika gagal
+        """
+        analysis = result.get('analysis', result)
+        chart_path = None
+        try:
+            if 'png' in formats:
+                chart_path = os.path.join(output_dir, f"{name}.png")
+                self._draw_analysis_chart(analysis)
+                self._save_figure(chart_path, self.chart_dpi, tight=False)
+            if 'pdf' in formats:
+                title = f"Safety Report: {os.path.basename(result.get('image_path', name))}"
+                story = self._build_report_story(analysis, title=title, chart_path=chart_path)
+                self._write_pdf(story, os.path.join(output_dir, f"{name}.pdf"))
+            return 1
+        except Exception as e:
+            print(f"Error rendering report {name}: {e}")
+            METRICS.inc('errors', 'report')
+            return 0
+    
+    def generate_batch_reports(self, results: Iterable[Dict], output_dir: str = "batch_reports",
+                               workers: int = 1, chunksize: int = 32,
+                               formats: Tuple[str, ...] = ('pdf', 'png'), chart_dpi: int = 100) -> Dict:
+        """
+        Render laporan per produk untuk seluruh hasil batch, lalu satu laporan gabungan
+        results boleh berupa generator (mis. load_batch_results); workers > 1 = render paralel
+        Returns: ringkasan (jumlah laporan, error, path laporan gabungan, durasi)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        start = time.perf_counter()
+        summary = BatchReportSummary()
+        rendered = 0
+        
+        def named_chunks() -> Iterator[List[Tuple[str, Dict]]]:
+            chunk = []
+            for index, result in enumerate(results):
+                stem = os.path.splitext(os.path.basename(result.get('image_path', '')))[0] or 'product'
+                name = f"{index:05d}_{stem}"
+                summary.add(name, result)
+                if 'error' in result:
+                    continue
+                chunk.append((name, result))
+                if len(chunk) >= chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        
+        if workers <= 1:
+            worker = ReportGenerator(chart_dpi=chart_dpi)
+            for chunk in named_chunks():
+                rendered += sum(worker.render_product_report(result, output_dir, name, formats)
+                                for name, result in chunk)
+        else:
+            # Batasi chunk yang sedang dirender agar memori tetap datar
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_report_worker,
+                                     initargs=(chart_dpi, tuple(formats))) as executor:
+                for chunk in named_chunks():
+                    pending.append(executor.submit(_render_reports_in_worker, chunk, output_dir))
+                    while len(pending) >= workers * 2:
+                        rendered += pending.popleft().result()
+                while pending:
+                    rendered += pending.popleft().result()
+        
+        summary_pdf, summary_chart = self.generate_batch_summary(summary, output_dir)
+        elapsed = time.perf_counter() - start
+        print(f"{rendered} laporan produk dibuat dalam {elapsed:.1f}s -> {output_dir}")
+        return {
+            'reports': rendered,
+            'products': summary.products,
+            'errors': summary.errors,
+            'summary_pdf': summary_pdf,
+            'summary_chart': summary_chart,
+            'elapsed': elapsed
+        }
+    
+    def _draw_summary_chart(self, summary: BatchReportSummary):
+        (status_ax, top_ax, category_ax, hist_ax), _ = self._get_axes('summary')
+        
+        statuses = sorted(summary.statuses)
+        if statuses:
+            status_ax.pie([summary.statuses[s] for s in statuses], labels=statuses, autopct='%1.1f%%',
+                          colors=[STATUS_COLORS.get(s, '#cccccc') for s in statuses], startangle=90)
+        status_ax.set_title('Product Status Distribution')
+        
+        top = summary.top_dangerous()
+        top_ax.barh([name for name, _ in reversed(top)], [count for _, count in reversed(top)], color='#ff6b6b')
+        top_ax.set_title('Most Frequent Dangerous Ingredients')
+        top_ax.set_xlabel('Number of Products')
+        
+        category_ax.bar(REPORT_CATEGORIES, list(summary.category_totals.values()), color=REPORT_COLORS)
+        category_ax.set_title('Ingredient Count by Category (All Products)')
+        category_ax.set_ylabel('Number of Ingredients')
+        
+        if summary.dangerous_per_product:
+            bins = range(0, max(summary.dangerous_per_product) + 2)
+            hist_ax.hist(summary.dangerous_per_product, bins=bins, color='#ffa94d', align='left')
+            hist_ax.set_xticks(list(bins)[:-1])
+        hist_ax.set_title('Dangerous Ingredients per Product')
+        hist_ax.set_xlabel('Dangerous Ingredients')
+        hist_ax.set_ylabel('Number of Products')
+    
+    def generate_batch_summary(self, summary: BatchReportSummary,
+                               output_dir: str = "batch_reports") -> Tuple[Optional[str], Optional[str]]:
+        """
+        Laporan gabungan untuk satu batch
+        Returns: (path PDF, path chart PNG); None untuk yang gagal dibuat
+        """
+        chart_path = os.path.join(output_dir, "batch_summary.png")
+        pdf_path = os.path.join(output_dir, "batch_summary.pdf")
+        try:
+            self._draw_summary_chart(summary)
+            self._save_figure(chart_path, self.chart_dpi)
+        except Exception as e:
+            print(f"Error generating batch summary chart: {e}")
+            chart_path = None
+        
+        try:
+            kit = self._get_pdf_kit()
+            Paragraph, Spacer, Table, inch = kit['Paragraph'], kit['Spacer'], kit['Table'], kit['inch']
+            styles = kit['styles']
+            story = [Paragraph("Pet Product Batch Safety Report", kit['title']), Spacer(1, 0.3*inch)]
             
-            # Safety score gauge (placeholder)
-            plt.subplot(2, 2, 3)
-            safety_score = 75  # Placeholder
-            plt.bar(['Safety Score'], [safety_score], color='green' if safety_score > 70 else 'orange' if safety_score > 40 else 'red')
-            plt.ylim(0, 100)
-            plt.title('Overall Safety Score')
-            plt.ylabel('Score (%)')
+            overview = [['Metric', 'Count'], ['Products Analyzed', summary.products], ['Errors', summary.errors]]
+            overview += [[f"Status: {status}", count] for status, count in sorted(summary.statuses.items())]
+            table = Table(overview)
+            table.setStyle(kit['table'])
+            story += [table, Spacer(1, 0.3*inch)]
             
-            # Timeline or trends (placeholder)
-            plt.subplot(2, 2, 4)
-            months = ['Jan', 'Feb', 'Mar', 'Apr', 'May']
-            safety_trend = [65, 70, 68, 75, 78]  # Placeholder data
-            plt.plot(months, safety_trend, marker='o', color='blue')
-            plt.title('Safety Trend Over Time')
-            plt.ylabel('Safety Score')
+            if chart_path:
+                story += [kit['Image'](chart_path, width=6*inch, height=4.8*inch), Spacer(1, 0.3*inch)]
             
-            plt.tight_layout()
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            plt.close()
+            top = summary.top_dangerous(20)
+            if top:
+                story.append(Paragraph("Most Frequent Dangerous Ingredients", styles['Heading2']))
+                table = Table([['Ingredient', 'Products']] + [[name, count] for name, count in top])
+                table.setStyle(kit['list_table'])
+                story += [table, Spacer(1, 0.3*inch)]
             
-            print(f"Visualization saved: {save_path}")
+            if summary.flagged:
+                story.append(Paragraph(f"Products with Dangerous Ingredients ({len(summary.flagged)})",
+                                       styles['Heading2']))
+                rows = [[name, status, Paragraph(dangerous, styles['Normal'])]
+                        for name, status, dangerous in summary.flagged[:SUMMARY_MAX_ROWS]]
+                table = Table([['Product', 'Status', 'Dangerous Ingredients']] + rows,
+                              colWidths=[2*inch, 0.9*inch, 3.6*inch], repeatRows=1)
+                table.setStyle(kit['list_table'])
+                story.append(table)
+                if len(summary.flagged) > SUMMARY_MAX_ROWS:
+                    story.append(Paragraph(f"... dan {len(summary.flagged) - SUMMARY_MAX_ROWS} produk lainnya",
+                                           styles['Normal']))
             
+            self._write_pdf(story, pdf_path)
+        except ImportError:
+            print("ReportLab not installed. Install with: pip install reportlab")
+            pdf_path = None
         except Exception as e:
-            print(f"Error generating visualization: {e}")
+            print(f"Error generating batch summary PDF: {e}")
+            pdf_path = None
+        
+        return pdf_path, chart_path
+
+# State per worker process untuk BatchProcessor (dibuat sekali per proses)
+_worker_state = {}
+
+def _init_batch_worker(analyzer, image_processor, metrics_enabled: bool = False):
+    """Initializer worker: simpan analyzer dan image processor untuk dipakai ulang"""
+    METRICS.enabled = metrics_enabled
+    # Satu thread per proses agar OpenCV/Tesseract tidak berebut core
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    cv2.setNumThreads(1)
+    _worker_state['processor'] = BatchProcessor(analyzer, image_processor)
+
+def _process_chunk_in_worker(image_paths: List[str]) -> Tuple[List, Optional[Dict]]:
+    """
+    Proses satu chunk gambar di dalam worker process
+    Returns: (hasil, metrik worker untuk digabung di parent)
+    """
+    processor = _worker_state['processor']
+    results = [processor._process_single(image_path) for image_path in image_paths]
+    return results, METRICS.drain() if METRICS.enabled else None
 
 class BatchProcessor:
     """Pemrosesan batch untuk multiple gambar"""
     
-    def __init__(self, analyzer, image_processor):
+    def __init__(self, analyzer, image_processor, ocr_cache=None):
         self.analyzer = analyzer
         self.image_processor = image_processor
+        
+        # Cache OCR di disk (OCRCache) dipakai bersama oleh semua worker
+        if ocr_cache is not None:
+            self.image_processor.ocr_cache = ocr_cache
     
-    def process_batch(self, image_paths: List[str]) -> List[Dict]:
+    @METRICS.timed('batch_image')
+    def _process_single(self, image_path: str):
         """
-        Proses multiple gambar sekaligus
+        Proses satu gambar
+        Returns: dictionary hasil, atau None jika gambar tidak dapat dibaca
         """
-        results = []
-        
-        for i, image_path in enumerate(image_paths):
-            print(f"Processing image {i+1}/{len(image_paths)}: {image_path}")
+        try:
+            # Load image
+            image = cv2.imread(image_path)
+            if image is None:
+                print(f"Error loading image: {image_path}")
+                METRICS.inc('errors', 'batch_decode')
+                return None
             
-            try:
-                # Load image
-                image = cv2.imread(image_path)
-                if image is None:
-                    print(f"Error loading image: {image_path}")
+            # Extract text
+            text = self.image_processor.extract_text(image)
+            
+            # Analyze ingredients
+            analysis = self.analyzer.analyze_ingredients(text)
+            
+            # Compile results (ID bahan disimpan untuk re-analisis inkremental)
+            from pet_product_utils import analysis_ingredient_ids
+            METRICS.inc('images_processed', 'batch')
+            return {
+                'image_path': image_path,
+                'extracted_text': text,
+                'analysis': analysis,
+                'ingredient_ids': analysis_ingredient_ids(analysis),
+                'timestamp': datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            print(f"Error processing {image_path}: {e}")
+            METRICS.inc('errors', 'batch')
+            return {
+                'image_path': image_path,
+                'error': str(e),
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def iter_batch(self, image_paths: Iterable[str], workers: int = 1, chunksize: int = 4) -> Iterator[Dict]:
+        """
+        Generator hasil batch: setiap hasil di-yield begitu selesai (urutan sesuai input)
+        Jumlah chunk yang sedang diproses dibatasi sehingga memori tetap datar
+        """
+        if workers <= 1:
+            for i, image_path in enumerate(image_paths):
+                print(f"Processing image {i+1}: {image_path}")
+                result = self._process_single(image_path)
+                if result is not None:
+                    yield result
+            return
+        
+        max_pending = workers * 2
+        pending = deque()
+        processed = 0
+        
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(self.analyzer, self.image_processor, METRICS.enabled)
+        ) as executor:
+            chunk = []
+            for image_path in image_paths:
+                chunk.append(image_path)
+                if len(chunk) < chunksize:
                     continue
+                pending.append((chunk, executor.submit(_process_chunk_in_worker, chunk)))
+                chunk = []
                 
-                # Extract text
-                text = self.image_processor.extract_text(image)
-                
-                # Analyze ingredients
-                analysis = self.analyzer.analyze_ingredients(text)
-                
-                # Compile results
-                result = {
-                    'image_path': image_path,
-                    'extracted_text': text,
-                    'analysis': analysis,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                results.append(result)
-                
-            except Exception as e:
-                print(f"Error processing {image_path}: {e}")
-                results.append({
-                    'image_path': image_path,
-                    'error': str(e),
-                    'timestamp': datetime.now().isoformat()
-                })
-        
-        return results
+                # Tunggu chunk tertua sebelum mengirim chunk baru
+                while len(pending) >= max_pending:
+                    done_chunk = pending.popleft()
+                    for result in self._drain_chunk(done_chunk, processed):
+                        yield result
+                    processed += len(done_chunk[0])
+            
+            if chunk:
+                pending.append((chunk, executor.submit(_process_chunk_in_worker, chunk)))
+            while pending:
+                done_chunk = pending.popleft()
+                for result in self._drain_chunk(done_chunk, processed):
+                    yield result
+                processed += len(done_chunk[0])
+    
+    def _drain_chunk(self, pending_chunk, processed: int) -> Iterator[Dict]:
+        """Ambil hasil satu chunk dari worker"""
+        chunk, future = pending_chunk
+        results, worker_metrics = future.result()
+        METRICS.merge(worker_metrics)
+        for offset, (image_path, result) in enumerate(zip(chunk, results)):
+            print(f"Processed image {processed + offset + 1}: {image_path}")
+            if result is not None:
+                yield result
+    
+    def process_batch(self, image_paths: List[str], workers: int = 1, chunksize: int = 4) -> List[Dict]:
+        """
+        Proses multiple gambar sekaligus
+        workers > 1 menjalankan OCR di beberapa process; urutan hasil tetap sama dengan input
+        """
+        return list(self.iter_batch(image_paths, workers=workers, chunksize=chunksize))
     
     def save_batch_results(self, results: List[Dict], output_file: str = "batch_results.json"):
         """
@@ -396,6 +1541,260 @@ class BatchProcessor:
             print(f"Batch results saved to: {output_file}")
         except Exception as e:
             print(f"Error saving batch results: {e}")
+    
+    def stream_batch_results(self, results: Iterable[Dict], output_file: str = "batch_results.jsonl",
+                             fsync: bool = False) -> int:
+        """
+        Tulis hasil batch sebagai JSON Lines (append), flush setiap baris
+        Hasil yang sudah ditulis tetap ada walaupun proses crash di tengah jalan
+        Error menulis file dicetak; error dari results (mis. BrokenProcessPool di
+        iter_batch) diteruskan agar run yang gagal tidak terlihat selesai
+        Returns: jumlah hasil yang ditulis
+        """
+        written = 0
+        try:
+            f = open(output_file, 'a', encoding='utf-8')
+        except OSError as e:
+            print(f"Error streaming batch results: {e}")
+            return written
+        with f:
+            for result in results:
+                line = json.dumps(result, ensure_ascii=False) + "\n"
+                try:
+                    f.write(line)
+                    f.flush()
+                    if fsync:
+                        os.fsync(f.fileno())
+                except OSError as e:
+                    print(f"Error streaming batch results: {e}")
+                    return written
+                written += 1
+        print(f"Batch results streamed to: {output_file} ({written} results)")
+        return written
+    
+    def load_batch_results(self, input_file: str = "batch_results.jsonl") -> Iterator[Dict]:
+        """
+        Baca hasil batch JSON Lines satu per satu
+        Baris terakhir yang terpotong (karena crash) dilewati
+        """
+        try:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Melewati baris rusak di {input_file}")
+        except FileNotFoundError:
+            print(f"File {input_file} tidak ditemukan")
+
+class AnalysisHistoryStore:
+    """
+    Riwayat hasil analisis untuk re-analisis inkremental saat database bahan berubah
+    - products: teks OCR + hasil analisis terakhir per gambar (OCR tidak perlu diulang)
+    - product_ingredients: inverted index ID bahan -> produk
+    - text_fts: FTS5 trigram atas teks bersih untuk mencari produk yang memuat alias baru
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY,
+            image_path TEXT UNIQUE NOT NULL,
+            extracted_text TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            status TEXT NOT NULL,
+            analyzed_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS product_ingredients (
+            ingredient_id TEXT NOT NULL,
+            product_id INTEGER NOT NULL REFERENCES products(id),
+            PRIMARY KEY (ingredient_id, product_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS product_ingredients_product ON product_ingredients(product_id);
+        CREATE VIRTUAL TABLE IF NOT EXISTS text_fts USING fts5(text, tokenize='trigram');
+    """
+    
+    def __init__(self, db_path: str = "analysis_history.sqlite"):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.executescript(self.SCHEMA)
+    
+    def __getstate__(self):
+        # Koneksi SQLite tidak bisa di-pickle; setiap worker membuka koneksi sendiri
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Koneksi per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+    
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    
+    def _upsert(self, connection: sqlite3.Connection, image_path: str, text: str, analysis: Dict,
+                ingredient_ids: List[str], status: str, analyzed_at: str):
+        from pet_product_utils import clean_label_text
+        
+        connection.execute(
+            "INSERT INTO products (image_path, extracted_text, analysis, status, analyzed_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(image_path) DO UPDATE SET extracted_text=excluded.extracted_text, "
+            "analysis=excluded.analysis, status=excluded.status, analyzed_at=excluded.analyzed_at",
+            (image_path, text, json.dumps(analysis, ensure_ascii=False), status, analyzed_at)
+        )
+        product_id = connection.execute(
+            "SELECT id FROM products WHERE image_path = ?", (image_path,)
+        ).fetchone()[0]
+        connection.execute("DELETE FROM product_ingredients WHERE product_id = ?", (product_id,))
+        connection.executemany(
+            "INSERT OR IGNORE INTO product_ingredients (ingredient_id, product_id) VALUES (?, ?)",
+            [(ingredient_id, product_id) for ingredient_id in ingredient_ids]
+        )
+        connection.execute("DELETE FROM text_fts WHERE rowid = ?", (product_id,))
+        connection.execute("INSERT INTO text_fts (rowid, text) VALUES (?, ?)",
+                           (product_id, clean_label_text(text)))
+    
+    def add_results(self, results: Iterable[Dict]) -> int:
+        """
+        Simpan hasil BatchProcessor (list, generator, atau load_batch_results)
+        Hasil error dilewati; gambar yang sama menimpa entry lama
+        Returns: jumlah hasil yang disimpan
+        """
+        from pet_product_utils import IngredientAnalyzer, analysis_ingredient_ids
+        
+        connection = self._connect()
+        stored = 0
+        with connection:
+            for result in results:
+                if 'error' in result or 'analysis' not in result:
+                    continue
+                analysis = result['analysis']
+                ingredient_ids = result.get('ingredient_ids') or analysis_ingredient_ids(analysis)
+                status = IngredientAnalyzer.get_recommendation(analysis)['status']
+                self._upsert(connection, result['image_path'], result.get('extracted_text', ''), analysis,
+                             ingredient_ids, status, result.get('timestamp') or datetime.now().isoformat())
+                stored += 1
+        return stored
+    
+    def products_with_ingredients(self, ingredient_ids: Iterable[str]) -> set:
+        """ID produk yang hasil analisisnya memuat salah satu bahan (inverted index)"""
+        connection = self._connect()
+        product_ids = set()
+        for ingredient_id in ingredient_ids:
+            product_ids.update(row[0] for row in connection.execute(
+                "SELECT product_id FROM product_ingredients WHERE ingredient_id = ?", (ingredient_id,)
+            ))
+        return product_ids
+    
+    def products_with_text(self, aliases: Iterable[str]) -> set:
+        """ID produk yang teksnya memuat salah satu alias (substring, lewat FTS5 trigram)"""
+        from pet_product_utils import clean_label_text
+        
+        connection = self._connect()
+        product_ids = set()
+        for alias in aliases:
+            alias = clean_label_text(alias)
+            if not alias:
+                continue
+            if len(alias) < 3:
+                # Di bawah batas tokenizer trigram: scan teks
+                rows = connection.execute("SELECT rowid FROM text_fts WHERE instr(text, ?) > 0", (alias,))
+            else:
+                phrase = '"' + alias.replace('"', '""') + '"'
+                rows = connection.execute("SELECT rowid FROM text_fts WHERE text_fts MATCH ?", (phrase,))
+            product_ids.update(row[0] for row in rows)
+        return product_ids
+    
+    def reanalyze(self, analyzer, changed_ids: Iterable[str] = (), aliases: Iterable[str] = (),
+                  full: bool = False, chunk_size: int = 500) -> Dict:
+        """
+        Analisis ulang produk dari teks OCR tersimpan (tanpa OCR ulang)
+        Hanya produk yang memuat bahan di changed_ids atau teksnya memuat salah satu alias;
+        full=True menganalisis ulang semua produk (mis. untuk menangkap kecocokan fuzzy baru)
+        Returns: ringkasan (jumlah produk, perubahan status, durasi)
+        """
+        from pet_product_utils import analysis_ingredient_ids
+        
+        start = time.perf_counter()
+        connection = self._connect()
+        if full:
+            product_ids = [row[0] for row in connection.execute("SELECT id FROM products")]
+        else:
+            product_ids = sorted(self.products_with_ingredients(changed_ids) | self.products_with_text(aliases))
+        
+        status_changes = []
+        analyzed_at = datetime.now().isoformat()
+        for offset in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[offset:offset + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                f"SELECT image_path, extracted_text, status FROM products WHERE id IN ({placeholders})", chunk
+            ).fetchall()
+            with connection:
+                for image_path, text, old_status in rows:
+                    analysis = analyzer.analyze_ingredients(text)
+                    status = analyzer.get_recommendation(analysis)['status']
+                    self._upsert(connection, image_path, text, analysis, analysis_ingredient_ids(analysis),
+                                 status, analyzed_at)
+                    if status != old_status:
+                        status_changes.append({'image_path': image_path, 'old_status': old_status,
+                                               'new_status': status})
+        
+        METRICS.inc('products_reanalyzed', 'history', len(product_ids))
+        return {
+            'reanalyzed': len(product_ids),
+            'total': self.count(),
+            'status_changes': status_changes,
+            'seconds': time.perf_counter() - start
+        }
+    
+    def reanalyze_for_database_change(self, old_data: Dict, new_data: Dict, analyzer=None) -> Optional[Dict]:
+        """
+        Re-analisis setelah database bahan diperbarui (format ingredients_database.json)
+        Bahan yang berubah dicari lewat diff knowledge base lama vs baru
+        Returns: ringkasan reanalyze, atau None jika database baru tidak valid
+        """
+        from pet_product_utils import (IngredientAnalyzer, compile_knowledge_base,
+                                       diff_knowledge_bases, validate_ingredients_database)
+        
+        for label, data in (('lama', old_data), ('baru', new_data)):
+            errors = validate_ingredients_database(data)
+            if errors:
+                print(f"Database {label} tidak valid:")
+                for error in errors:
+                    print(f"  - {error}")
+                return None
+        
+        new_kb = compile_knowledge_base(new_data)
+        changed_ids, aliases = diff_knowledge_bases(compile_knowledge_base(old_data), new_kb)
+        if not changed_ids:
+            return {'reanalyzed': 0, 'total': self.count(), 'status_changes': [], 'seconds': 0.0,
+                    'changed_ingredients': []}
+        
+        analyzer = analyzer or IngredientAnalyzer(knowledge_base=new_kb)
+        summary = self.reanalyze(analyzer, changed_ids, aliases)
+        summary['changed_ingredients'] = changed_ids
+        return summary
 
 # Example usage functions
 def example_advanced_usage():
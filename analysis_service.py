@@ -0,0 +1,252 @@
+"""
+Headless HTTP API untuk Pet Product Safety Analyzer
+
+Endpoint:
+    POST /analyze/image   body: bytes gambar (JPG/PNG)
+    POST /analyze/text    body: JSON {"text": "..."}
+    GET  /health          liveness
+    GET  /ready           readiness (503 jika antrian OCR penuh)
+    GET  /metrics         metrik format Prometheus
+
+OCR berjalan di process pool dengan batas antrian; jika penuh, request
+langsung ditolak dengan 429 (backpressure). Analisis bahan berjalan inline.
+
+Contoh:
+    python analysis_service.py --port 8080 --workers 4 --queue-limit 16
+"""
+
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from pet_product_metrics import METRICS
+from pet_product_utils import ImageProcessor, IngredientAnalyzer
+
+# State per worker process OCR (dibuat sekali per proses)
+_ocr_worker_state = {}
+
+def _init_ocr_worker(image_processor: ImageProcessor, metrics_enabled: bool = False):
+    """Initializer worker OCR"""
+    import cv2
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    cv2.setNumThreads(1)
+    METRICS.enabled = metrics_enabled
+    _ocr_worker_state['processor'] = image_processor
+
+def _ocr_in_worker(image_bytes: bytes) -> Tuple[str, Optional[Dict]]:
+    """
+    Decode + OCR di worker process (yang dikirim hanya bytes terkompresi)
+    Returns: (teks, metrik worker)
+    """
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Gambar tidak dapat dibaca")
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    text = _ocr_worker_state['processor'].extract_text(image)
+    return text, METRICS.drain() if METRICS.enabled else None
+
+class AnalysisService:
+    """Service analisis: pool OCR terbatas + analyzer inline"""
+
+    def __init__(self, workers: int = 2, queue_limit: int = 8, ocr_timeout: float = 30.0,
+                 image_processor: Optional[ImageProcessor] = None,
+                 analyzer: Optional[IngredientAnalyzer] = None):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.ocr_timeout = ocr_timeout
+        self.analyzer = analyzer or IngredientAnalyzer()
+        self.image_processor = image_processor or ImageProcessor()
+
+        # Slot = worker yang sedang jalan + antrian; lebih dari itu ditolak (429)
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._executor = None
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_ocr_worker,
+            initargs=(self.image_processor, METRICS.enabled)
+        )
+        # Panaskan worker agar request pertama tidak menanggung biaya start
+        for future in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def is_ready(self) -> bool:
+        return self._executor is not None and self._in_flight < self.workers + self.queue_limit
+
+    def _release_slot(self, future=None):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def analyze_text(self, text: str) -> Dict:
+        """Analisis teks (inline, tanpa OCR)"""
+        analysis = self.analyzer.analyze_ingredients(text)
+        return {
+            'analysis': analysis,
+            'recommendation': self.analyzer.get_recommendation(analysis)
+        }
+
+    def analyze_image(self, image_bytes: bytes) -> Optional[Dict]:
+        """
+        OCR di process pool lalu analisis inline
+        Returns: hasil, atau None jika pool OCR penuh
+        """
+        if not self._slots.acquire(blocking=False):
+            METRICS.inc('rejected', 'service_ocr')
+            return None
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(_ocr_in_worker, image_bytes)
+        except Exception:
+            self._release_slot()
+            raise
+        # Slot baru dilepas saat job benar-benar selesai (atau batal sebelum jalan), bukan saat
+        # request menyerah karena timeout; job yang masih jalan tetap dihitung untuk backpressure
+        future.add_done_callback(self._release_slot)
+
+        try:
+            text, worker_metrics = future.result(timeout=self.ocr_timeout)
+        except FutureTimeoutError:
+            # Hanya membatalkan job yang belum mulai; yang sudah jalan tetap memegang slot
+            future.cancel()
+            raise
+        METRICS.merge(worker_metrics)
+
+        result = self.analyze_text(text)
+        result['extracted_text'] = text
+        return result
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """Handler HTTP; service disimpan di server.service"""
+
+    protocol_version = "HTTP/1.1"
+    max_body_bytes = 15 * 1024 * 1024
+
+    def log_message(self, format, *args):
+        # Log akses default terlalu ramai untuk trafik tinggi
+        pass
+
+    def _send(self, status: int, payload, content_type: str = "application/json", headers: Dict = None):
+        if content_type == "application/json":
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        else:
+            body = payload.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> Optional[bytes]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send(400, {'error': 'Body kosong'})
+            return None
+        if length > self.max_body_bytes:
+            self._send(413, {'error': 'Body terlalu besar'})
+            self.close_connection = True
+            return None
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        elif self.path == '/ready':
+            ready = service.is_ready()
+            self._send(200 if ready else 503, {'ready': ready, 'in_flight': service.in_flight})
+        elif self.path == '/metrics':
+            self._send(200, METRICS.to_prometheus(), content_type="text/plain; version=0.0.4")
+        else:
+            self._send(404, {'error': 'Endpoint tidak ditemukan'})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path not in ('/analyze/image', '/analyze/text'):
+            self._send(404, {'error': 'Endpoint tidak ditemukan'})
+            return
+
+        body = self._read_body()
+        if body is None:
+            return
+
+        try:
+            if self.path == '/analyze/text':
+                payload = json.loads(body.decode('utf-8'))
+                text = payload.get('text') if isinstance(payload, dict) else None
+                if not isinstance(text, str):
+                    self._send(400, {'error': "Field 'text' wajib diisi"})
+                    return
+                with METRICS.timer('service_text_request'):
+                    self._send(200, service.analyze_text(text))
+                return
+
+            with METRICS.timer('service_image_request'):
+                result = service.analyze_image(body)
+            if result is None:
+                self._send(429, {'error': 'Server sibuk, coba lagi'}, headers={'Retry-After': '1'})
+            else:
+                self._send(200, result)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send(400, {'error': str(e)})
+        except FutureTimeoutError:
+            METRICS.inc('errors', 'service_timeout')
+            self._send(504, {'error': 'OCR timeout'})
+        except Exception as e:
+            print(f"Error dalam request {self.path}: {e}")
+            METRICS.inc('errors', 'service')
+            self._send(500, {'error': 'Internal error'})
+
+def create_server(host: str = "0.0.0.0", port: int = 8080, **service_options) -> ThreadingHTTPServer:
+    """Buat HTTP server beserta AnalysisService yang sudah berjalan"""
+    service = AnalysisService(**service_options)
+    service.start()
+    server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Pet Product Safety Analyzer HTTP API")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Jumlah worker OCR")
+    parser.add_argument('--queue-limit', type=int, default=16, help="Maksimum request OCR yang menunggu")
+    parser.add_argument('--ocr-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, workers=args.workers, queue_limit=args.queue_limit,
+                           ocr_timeout=args.ocr_timeout)
+    print(f"Service berjalan di http://{args.host}:{args.port} ({args.workers} worker OCR)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nService dihentikan")
+    finally:
+        server.service.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
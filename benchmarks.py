@@ -0,0 +1,464 @@
+"""
+Benchmark untuk Pet Product Safety Analyzer
+Mengukur latency komponen utama
+
+Contoh:
+    python benchmarks.py ocr --calls 50
+    python benchmarks.py preprocess
+    python benchmarks.py suite --images 40 --json run.json
+    python benchmarks.py compare baseline.json run.json
+    python benchmarks.py startup --budget-ms 150
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Ringkasan latency dalam milidetik"""
+    ordered = sorted(samples)
+    return {
+        'calls': len(ordered),
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'min_ms': ordered[0] * 1000,
+    }
+
+
+def render_label_crop(text: str, width: int = 600, font_size: int = 28) -> np.ndarray:
+    """Buat crop label sederhana (teks hitam di latar putih) dengan PIL"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+
+    lines = text.split("\n")
+    height = (font_size + 10) * len(lines) + 20
+    canvas = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(canvas)
+    for i, line in enumerate(lines):
+        draw.text((10, 10 + i * (font_size + 10)), line, fill="black", font=font)
+    return np.array(canvas)
+
+
+def benchmark_ocr(calls: int = 30) -> Dict[str, Dict]:
+    """Bandingkan latency per panggilan backend pytesseract vs tesserocr"""
+    from pet_product_utils import ImageProcessor
+
+    crop = render_label_crop("Ingredients: Aqua, Aloe Vera,\nSodium Lauryl Sulfate, Glycerin")
+    results = {}
+
+    for backend in ['pytesseract', 'tesserocr']:
+        processor = ImageProcessor(ocr_backend=backend)
+        processed = processor.preprocess_image(crop)
+
+        # Panggilan pertama memuat traineddata; tidak dihitung
+        processor.extract_text(processed, preprocess=False)
+        if backend == 'tesserocr' and processor._get_engine() is None:
+            results[backend] = {'error': 'tesserocr tidak tersedia'}
+            continue
+
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            processor.extract_text(processed, preprocess=False)
+            samples.append(time.perf_counter() - start)
+        results[backend] = _latency_summary(samples)
+
+    return results
+
+
+def benchmark_preprocess(repeats: int = 5) -> Dict[str, Dict]:
+    """Bandingkan waktu dan memori preprocess_image mode 'legacy' vs 'normalize'"""
+    from pet_product_utils import ImageProcessor
+
+    # Foto label resolusi tinggi (~12MP) dengan teks besar
+    label = render_label_crop("Ingredients: Aqua, Aloe Vera,\nSodium Lauryl Sulfate, Glycerin,\n"
+                              "Coconut Oil, Methylparaben", width=4000, font_size=160)
+    photo = np.full((3000, 4000, 3), 255, dtype=np.uint8)
+    photo[:label.shape[0]] = label
+
+    results = {}
+    for mode in ['legacy', 'normalize']:
+        processor = ImageProcessor(resolution_mode=mode)
+        samples = []
+        tracemalloc.start()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            processed = processor.preprocess_image(photo)
+            samples.append(time.perf_counter() - start)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        summary = _latency_summary(samples)
+        summary['peak_mb'] = peak / (1024 * 1024)
+        summary['scale'] = processor.last_scale
+        summary['output_shape'] = list(processed.shape)
+        results[mode] = summary
+
+    return results
+
+
+# Entry point yang diukur benchmark startup: nama -> kode import
+STARTUP_ENTRY_POINTS = {
+    'text_analyzer': "from pet_product_utils import IngredientAnalyzer",
+    'bulk_analyzer': "import bulk_analyzer",
+    'analysis_service': "import analysis_service",
+    'advanced_features': "import advanced_features",
+    'video_scanner': "import video_scanner",
+    # Saat deploy pet_product_utils.py bernama utils.py (lihat setup_instructions.py);
+    # import modul app menjalankan set_page_config dan dekorator cache, tanpa main()
+    'streamlit_app': ("import importlib.util\n"
+                      "if importlib.util.find_spec('utils') is None:\n"
+                      "    import pet_product_utils; sys.modules['utils'] = pet_product_utils\n"
+                      "import pet_product_analyzer_app"),
+}
+
+# Dependency berat yang seharusnya tidak ter-import oleh entry point text-only
+HEAVY_MODULES = ['cv2', 'numpy', 'pytesseract', 'matplotlib', 'PIL', 'requests', 'pandas']
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def benchmark_startup(repeats: int = 5, budget_ms: float = 150.0) -> Dict[str, Dict]:
+    """
+    Waktu import tiap entry point pada interpreter baru (cold start per proses)
+    text_analyzer ditandai over_budget jika p50 > budget_ms
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, code in STARTUP_ENTRY_POINTS.items():
+        script = _STARTUP_SCRIPT.format(code=code, heavy=HEAVY_MODULES)
+        samples = []
+        heavy = []
+        try:
+            for _ in range(repeats):
+                completed = subprocess.run([sys.executable, '-c', script], cwd=repo_dir,
+                                           capture_output=True, text=True, check=True)
+                measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+                samples.append(measurement['seconds'])
+                heavy = measurement['heavy']
+        except subprocess.CalledProcessError as e:
+            error_lines = e.stderr.strip().splitlines()
+            results[name] = {'error': error_lines[-1] if error_lines else str(e)}
+            continue
+
+        summary = _latency_summary(samples)
+        summary['heavy_modules'] = heavy
+        if name == 'text_analyzer':
+            summary['over_budget'] = summary['p50_ms'] > budget_ms
+        results[name] = summary
+
+    return results
+
+
+# Bahan yang dipakai untuk label sintetis (sebagian dikenal analyzer, sebagian tidak)
+CORPUS_FILLER_INGREDIENTS = ['aqua', 'citric acid', 'xanthan gum', 'sodium chloride', 'cocamidopropyl betaine']
+
+
+def _edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance penuh (untuk character error rate)"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+        previous = current
+    return previous[len(b)]
+
+
+def _wrap_ingredients(ingredients: List[str], per_line: int = 3) -> str:
+    lines = []
+    for start in range(0, len(ingredients), per_line):
+        lines.append(', '.join(ingredients[start:start + per_line]))
+    return "Ingredients: " + ",\n".join(lines)
+
+
+def generate_corpus(output_dir: str, images: int = 40, seed: int = 42) -> List[Dict]:
+    """
+    Buat korpus label sintetis yang reproducible (seed tetap)
+    Variasi: ukuran font, rotasi, noise, blur
+    Returns: manifest [{image_path, text, expected: {dangerous, safe}, variant}]
+    """
+    from PIL import Image, ImageFilter
+    from pet_product_utils import IngredientAnalyzer
+
+    analyzer = IngredientAnalyzer(fuzzy_max_edits=0)
+    dangerous = [name for name in analyzer.dangerous_ingredients if len(name) > 4]
+    safe = [name for name in analyzer.safe_ingredients if len(name) > 4]
+
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+
+    for i in range(images):
+        chosen_dangerous = rng.sample(dangerous, rng.randint(0, 3))
+        chosen_safe = rng.sample(safe, rng.randint(1, 4))
+        chosen = chosen_dangerous + chosen_safe + rng.sample(CORPUS_FILLER_INGREDIENTS, 2)
+        rng.shuffle(chosen)
+
+        text = _wrap_ingredients(chosen)
+        variant = {
+            'font_size': rng.choice([16, 22, 28, 40, 64]),
+            'rotation': rng.choice([0, 0, 2, -3, 5]),
+            'noise_sigma': rng.choice([0, 0, 8, 16]),
+            'blur_radius': rng.choice([0, 0, 0.8, 1.5]),
+        }
+
+        label = render_label_crop(text, width=variant['font_size'] * 28, font_size=variant['font_size'])
+        image = Image.fromarray(label)
+        if variant['rotation']:
+            image = image.rotate(variant['rotation'], expand=True, fillcolor="white")
+        if variant['blur_radius']:
+            image = image.filter(ImageFilter.GaussianBlur(variant['blur_radius']))
+        pixels = np.array(image).astype(np.float32)
+        if variant['noise_sigma']:
+            pixels += np_rng.normal(0, variant['noise_sigma'], pixels.shape)
+        pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+
+        image_path = os.path.join(output_dir, f"label_{i:04d}.png")
+        Image.fromarray(pixels).save(image_path)
+        manifest.append({
+            'image_path': image_path,
+            'text': text,
+            'expected': {'dangerous': sorted(chosen_dangerous), 'safe': sorted(chosen_safe)},
+            'variant': variant
+        })
+
+    with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _found_names(analysis: Dict, category: str) -> set:
+    return {entry['name'].lower() for entry in analysis.get(category, [])}
+
+
+def benchmark_suite(images: int = 40, seed: int = 42, corpus_dir: str = "benchmark_corpus",
+                    workers: int = 4) -> Dict:
+    """
+    Benchmark end-to-end: waktu per tahap + run BatchProcessor + akurasi OCR vs ground truth
+    """
+    import cv2
+    from pet_product_utils import ImageProcessor, IngredientAnalyzer
+    from advanced_features import BatchProcessor
+
+    manifest = generate_corpus(corpus_dir, images=images, seed=seed)
+    processor = ImageProcessor()
+    analyzer = IngredientAnalyzer()
+
+    stages = {name: [] for name in ['decode', 'preprocess_image', 'detect_label_area', 'extract_text',
+                                    'analyze_ingredients', 'get_recommendation']}
+    char_errors = 0
+    char_total = 0
+    true_positive = 0
+    expected_total = 0
+    found_total = 0
+
+    def timed(stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        stages[stage].append(time.perf_counter() - start)
+        return value
+
+    for item in manifest:
+        image = timed('decode', cv2.imread, item['image_path'])
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        processed = timed('preprocess_image', processor.preprocess_image, image)
+        timed('detect_label_area', processor.detect_label_area, image)
+        text = timed('extract_text', processor.extract_text, processed, preprocess=False)
+        analysis = timed('analyze_ingredients', analyzer.analyze_ingredients, text)
+        timed('get_recommendation', analyzer.get_recommendation, analysis)
+
+        # Akurasi OCR (character error rate) dan deteksi bahan
+        reference = ' '.join(item['text'].lower().split())
+        hypothesis = ' '.join(text.lower().split())
+        char_errors += _edit_distance(reference, hypothesis)
+        char_total += len(reference)
+
+        expected = set(item['expected']['dangerous']) | set(item['expected']['safe'])
+        found = _found_names(analysis, 'dangerous') | _found_names(analysis, 'safe')
+        true_positive += len(expected & found)
+        expected_total += len(expected)
+        found_total += len(found)
+
+    image_paths = [item['image_path'] for item in manifest]
+    batch = {}
+    for batch_workers in sorted({1, workers}):
+        batch_processor = BatchProcessor(analyzer, ImageProcessor())
+        start = time.perf_counter()
+        batch_processor.process_batch(image_paths, workers=batch_workers)
+        elapsed = time.perf_counter() - start
+        batch[f'workers_{batch_workers}'] = {
+            'seconds': elapsed,
+            'images_per_second': len(image_paths) / elapsed if elapsed else 0.0
+        }
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'images': images,
+            'seed': seed
+        },
+        'stages': {stage: _latency_summary(samples) for stage, samples in stages.items()},
+        'batch': batch,
+        'accuracy': {
+            'character_error_rate': char_errors / char_total if char_total else 0.0,
+            'ingredient_recall': true_positive / expected_total if expected_total else 0.0,
+            'ingredient_precision': true_positive / found_total if found_total else 0.0
+        }
+    }
+
+
+def compare_runs(baseline: Dict, current: Dict, tolerance: float = 0.10) -> List[str]:
+    """
+    Bandingkan dua hasil suite
+    Returns: daftar regresi (latency naik > tolerance, akurasi turun > tolerance absolut/100)
+    """
+    regressions = []
+    for stage, summary in current.get('stages', {}).items():
+        base = baseline.get('stages', {}).get(stage)
+        if base and base['p50_ms'] > 0 and summary['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{stage}: p50 {base['p50_ms']:.2f}ms -> {summary['p50_ms']:.2f}ms")
+
+    for run, summary in current.get('batch', {}).items():
+        base = baseline.get('batch', {}).get(run)
+        if base and summary['images_per_second'] < base['images_per_second'] * (1 - tolerance):
+            regressions.append(f"batch {run}: {base['images_per_second']:.2f} -> "
+                               f"{summary['images_per_second']:.2f} img/s")
+
+    accuracy = current.get('accuracy', {})
+    base_accuracy = baseline.get('accuracy', {})
+    if 'character_error_rate' in base_accuracy and \
+            accuracy.get('character_error_rate', 0) > base_accuracy['character_error_rate'] + tolerance / 10:
+        regressions.append(f"character_error_rate: {base_accuracy['character_error_rate']:.3f} -> "
+                           f"{accuracy['character_error_rate']:.3f}")
+    for metric in ['ingredient_recall', 'ingredient_precision']:
+        if metric in base_accuracy and accuracy.get(metric, 0) < base_accuracy[metric] - tolerance / 10:
+            regressions.append(f"{metric}: {base_accuracy[metric]:.3f} -> {accuracy.get(metric, 0):.3f}")
+
+    return regressions
+
+
+def _print_suite(results: Dict):
+    print("Waktu per tahap:")
+    _print_table(results['stages'])
+    print("\nBatchProcessor:")
+    for run, summary in results['batch'].items():
+        print(f"{run:<20} {summary['seconds']:.2f}s  ({summary['images_per_second']:.2f} img/s)")
+    print("\nAkurasi:")
+    for metric, value in results['accuracy'].items():
+        print(f"{metric:<22} {value:.3f}")
+
+
+def _print_table(results: Dict[str, Dict]):
+    for name, summary in results.items():
+        if 'error' in summary:
+            print(f"{name:<20} {summary['error']}")
+            continue
+        print(f"{name:<20} mean={summary['mean_ms']:.1f}ms  p50={summary['p50_ms']:.1f}ms  "
+              f"p95={summary['p95_ms']:.1f}ms  (n={summary['calls']})")
+        extra = {key: value for key, value in summary.items() if not key.endswith('_ms') and key != 'calls'}
+        if extra:
+            print(f"{'':<20} {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Pet Product Safety Analyzer")
+    parser.add_argument('--json', dest='json_output', help="Simpan hasil ke file JSON")
+    # --json juga diterima setelah subcommand (SUPPRESS agar tidak menimpa nilai sebelum subcommand)
+    output_parser = argparse.ArgumentParser(add_help=False)
+    output_parser.add_argument('--json', dest='json_output', default=argparse.SUPPRESS,
+                               help="Simpan hasil ke file JSON")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ocr_parser = subparsers.add_parser('ocr', help="Latency per panggilan backend OCR", parents=[output_parser])
+    ocr_parser.add_argument('--calls', type=int, default=30)
+
+    preprocess_parser = subparsers.add_parser('preprocess', help="Waktu/memori normalisasi resolusi",
+                                              parents=[output_parser])
+    preprocess_parser.add_argument('--repeats', type=int, default=5)
+
+    suite_parser = subparsers.add_parser('suite', help="Benchmark end-to-end dengan korpus label sintetis",
+                                         parents=[output_parser])
+    suite_parser.add_argument('--images', type=int, default=40)
+    suite_parser.add_argument('--seed', type=int, default=42)
+    suite_parser.add_argument('--corpus-dir', default="benchmark_corpus")
+    suite_parser.add_argument('--workers', type=int, default=4)
+
+    compare_parser = subparsers.add_parser('compare', help="Bandingkan dua hasil suite (JSON)")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.10)
+
+    startup_parser = subparsers.add_parser('startup', help="Waktu import (cold start) tiap entry point",
+                                           parents=[output_parser])
+    startup_parser.add_argument('--repeats', type=int, default=5)
+    startup_parser.add_argument('--budget-ms', type=float, default=150.0,
+                                help="Batas p50 import text_analyzer; exit 1 jika terlampaui")
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+        regressions = compare_runs(baseline, current, tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESI: {regression}")
+        if not regressions:
+            print("Tidak ada regresi")
+        raise SystemExit(1 if regressions else 0)
+
+    if args.command == 'ocr':
+        results = benchmark_ocr(calls=args.calls)
+        _print_table(results)
+    elif args.command == 'preprocess':
+        results = benchmark_preprocess(repeats=args.repeats)
+        _print_table(results)
+    elif args.command == 'suite':
+        results = benchmark_suite(images=args.images, seed=args.seed, corpus_dir=args.corpus_dir,
+                                  workers=args.workers)
+        _print_suite(results)
+    elif args.command == 'startup':
+        results = benchmark_startup(repeats=args.repeats, budget_ms=args.budget_ms)
+        _print_table(results)
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Hasil benchmark disimpan ke {args.json_output}")
+
+    if args.command == 'startup' and results.get('text_analyzer', {}).get('over_budget', True):
+        print(f"REGRESI: import text_analyzer melebihi budget {args.budget_ms:.0f}ms")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Analisis bulk teks komposisi (tanpa OCR) untuk feed katalog supplier
+
+Input dibaca bertahap per chunk (CSV, JSONL, atau Parquet), dianalisis di
+beberapa process (matcher dibangun sekali per worker), lalu hasilnya ditulis
+bertahap dalam bentuk kolom (Parquet jika pyarrow tersedia, selain itu CSV).
+Memori tetap terbatas berapa pun ukuran file.
+
+Contoh:
+    python bulk_analyzer.py katalog.csv hasil.parquet --text-column ingredients --id-column sku
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pet_product_utils import IngredientAnalyzer
+
+# Kolom output (urutan tetap)
+RESULT_COLUMNS = ['id', 'status', 'dangerous_count', 'safe_count', 'unknown_count', 'fuzzy_count',
+                  'dangerous', 'safe', 'unknown', 'fuzzy']
+
+# Analyzer per worker process (dibangun sekali lalu dipakai ulang)
+_bulk_worker_state = {}
+
+def _init_bulk_worker(analyzer: IngredientAnalyzer):
+    _bulk_worker_state['analyzer'] = analyzer
+
+def analyze_rows(analyzer: IngredientAnalyzer, rows: List[Tuple[str, str]]) -> Dict[str, list]:
+    """Analisis satu chunk (id, teks) menjadi kolom-kolom hasil"""
+    columns = {name: [] for name in RESULT_COLUMNS}
+    for row_id, text in rows:
+        analysis = analyzer.analyze_ingredients(text or "")
+        recommendation = analyzer.get_recommendation(analysis)
+        fuzzy = analysis.get('fuzzy', [])
+        columns['id'].append(row_id)
+        columns['status'].append(recommendation['status'])
+        columns['dangerous_count'].append(len(analysis['dangerous']))
+        columns['safe_count'].append(len(analysis['safe']))
+        columns['unknown_count'].append(len(analysis['unknown']))
+        columns['fuzzy_count'].append(len(fuzzy))
+        columns['dangerous'].append('; '.join(entry['name'] for entry in analysis['dangerous']))
+        columns['safe'].append('; '.join(entry['name'] for entry in analysis['safe']))
+        columns['unknown'].append('; '.join(sorted(analysis['unknown'])))
+        columns['fuzzy'].append('; '.join(entry['name'] for entry in fuzzy))
+    return columns
+
+def _analyze_chunk_in_worker(rows: List[Tuple[str, str]]) -> Dict[str, list]:
+    return analyze_rows(_bulk_worker_state['analyzer'], rows)
+
+def _detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    return 'csv'
+
+def _coerce_text(value, row_number: int) -> str:
+    """Nilai kolom teks -> string (list bahan digabung koma, kosong -> '')"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value if item is not None)
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise ValueError(f"Baris {row_number}: nilai kolom teks bertipe {type(value).__name__} tidak didukung")
+
+def _check_columns(available, required: List[str], path: str):
+    missing = [column for column in required if column not in available]
+    if missing:
+        raise KeyError(f"Kolom {', '.join(missing)} tidak ada di {path} (tersedia: {', '.join(available)})")
+
+def read_chunks(path: str, text_column: str, id_column: Optional[str] = None,
+                chunk_size: int = 5000, input_format: Optional[str] = None) -> Iterator[List[Tuple[str, str]]]:
+    """
+    Baca file input per chunk
+    Yields: list (id, teks); id = nomor baris jika id_column tidak diberikan
+    Raises: KeyError jika kolom tidak ada, ValueError jika nilai teks tidak valid
+    """
+    input_format = input_format or _detect_format(path)
+    columns = [text_column] + ([id_column] if id_column else [])
+    row_number = 0
+    chunk = []
+
+    if input_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow diperlukan untuk membaca Parquet. Install dengan: pip install pyarrow")
+        parquet_file = pq.ParquetFile(path)
+        _check_columns(parquet_file.schema_arrow.names, columns, path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            texts = batch.column(text_column).to_pylist()
+            ids = batch.column(id_column).to_pylist() if id_column else None
+            rows = []
+            for offset, text in enumerate(texts):
+                rows.append((str(ids[offset]) if ids else str(row_number), _coerce_text(text, row_number)))
+                row_number += 1
+            yield rows
+        return
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if input_format == 'jsonl':
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+            _check_columns(records.fieldnames or [], columns, path)
+        for record in records:
+            if input_format == 'jsonl':
+                # JSONL tanpa header: cek per record (null tetap boleh)
+                if not isinstance(record, dict):
+                    raise ValueError(f"Baris {row_number}: record JSONL harus berupa object")
+                _check_columns(record.keys(), columns, f"{path} baris {row_number}")
+            row_id = str(record[id_column]) if id_column else str(row_number)
+            chunk.append((row_id, _coerce_text(record[text_column], row_number)))
+            row_number += 1
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+class ColumnarResultWriter:
+    """Tulis hasil per chunk: Parquet (pyarrow) atau CSV sebagai fallback"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows_written = 0
+        self._parquet_writer = None
+        self._csv_file = None
+        self._csv_writer = None
+
+        if _detect_format(path) == 'parquet':
+            try:
+                import pyarrow
+                self._pyarrow = pyarrow
+            except ImportError:
+                self.path = os.path.splitext(path)[0] + ".csv"
+                print(f"pyarrow tidak terinstall, hasil ditulis sebagai CSV ke {self.path}")
+        if not self.path.endswith(('.parquet', '.pq')):
+            self._csv_file = open(self.path, 'w', encoding='utf-8', newline='')
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow(RESULT_COLUMNS)
+
+    def write(self, columns: Dict[str, list]):
+        if self._csv_writer is not None:
+            self._csv_writer.writerows(zip(*(columns[name] for name in RESULT_COLUMNS)))
+            self._csv_file.flush()
+        else:
+            import pyarrow.parquet as pq
+            table = self._pyarrow.table({name: columns[name] for name in RESULT_COLUMNS})
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        self.rows_written += len(columns['id'])
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+
+def run_bulk_analysis(input_path: str, output_path: str, text_column: str = 'ingredients',
+                      id_column: Optional[str] = None, chunk_size: int = 5000, workers: int = 1,
+                      analyzer: Optional[IngredientAnalyzer] = None) -> int:
+    """
+    Jalankan analisis bulk
+    Returns: jumlah baris yang dianalisis
+    """
+    # Teks katalog bukan hasil OCR: fuzzy lookup tidak dipakai (biaya per baris)
+    analyzer = analyzer or IngredientAnalyzer(fuzzy_max_edits=0)
+    writer = ColumnarResultWriter(output_path)
+    chunks = read_chunks(input_path, text_column, id_column=id_column, chunk_size=chunk_size)
+    start = time.perf_counter()
+
+    try:
+        if workers <= 1:
+            for rows in chunks:
+                writer.write(analyze_rows(analyzer, rows))
+        else:
+            # Batasi chunk yang sedang diproses agar memori tetap datar; urutan output = urutan input
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_bulk_worker,
+                                     initargs=(analyzer,)) as executor:
+                for rows in chunks:
+                    pending.append(executor.submit(_analyze_chunk_in_worker, rows))
+                    while len(pending) >= workers * 2:
+                        writer.write(pending.popleft().result())
+                while pending:
+                    writer.write(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    rate = writer.rows_written / elapsed * 3600 if elapsed else 0
+    print(f"{writer.rows_written} baris dianalisis dalam {elapsed:.1f}s ({rate:,.0f} baris/jam) -> {writer.path}")
+    return writer.rows_written
+
+def main():
+    parser = argparse.ArgumentParser(description="Analisis bulk teks komposisi produk")
+    parser.add_argument('input', help="File input (.csv, .jsonl, .parquet)")
+    parser.add_argument('output', help="File output (.parquet atau .csv)")
+    parser.add_argument('--text-column', default='ingredients')
+    parser.add_argument('--id-column', default=None)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    try:
+        run_bulk_analysis(args.input, args.output, text_column=args.text_column, id_column=args.id_column,
+                          chunk_size=args.chunk_size, workers=args.workers)
+    except (RuntimeError, FileNotFoundError, KeyError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
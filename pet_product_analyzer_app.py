@@ -1,13 +1,17 @@
 import streamlit as st
-import cv2
-import numpy as np
-from PIL import Image
-import pytesseract
 import json
 import re
-from utils import IngredientAnalyzer, ImageProcessor
+import io
+import hashlib
+from utils import IngredientAnalyzer, ImageProcessor, OCRCache
+from pet_product_lazy import lazy_import
+from pet_product_metrics import METRICS
 import os
 
+# numpy/PIL baru di-import saat ada gambar yang diupload
+np = lazy_import('numpy')
+Image = lazy_import('PIL.Image')
+
 # Konfigurasi halaman
 st.set_page_config(
     page_title="Pet Product Safety Analyzer",
@@ -18,7 +22,46 @@ st.set_page_config(
 # Inisialisasi analyzer
 @st.cache_resource
 def load_analyzer():
-    return IngredientAnalyzer()
+    # Teks berasal dari OCR: aktifkan fuzzy lookup untuk salah baca
+    return IngredientAnalyzer(fuzzy_max_edits=2)
+
+@st.cache_resource
+def load_ocr_cache():
+    return OCRCache()
+
+@st.cache_resource
+def load_image_processor():
+    return ImageProcessor(ocr_cache=load_ocr_cache())
+
+def get_upload_state(file_bytes: bytes) -> dict:
+    """
+    State per upload (gambar, hasil preprocessing, OCR, analisis) yang dipakai ulang antar rerun
+    Key berupa hash konten; hanya upload terakhir yang disimpan
+    """
+    upload_key = hashlib.sha256(file_bytes).hexdigest()
+    upload_state = st.session_state.get('upload_state')
+    if upload_state is None or upload_state['key'] != upload_key:
+        upload_state = {'key': upload_key}
+        st.session_state['upload_state'] = upload_state
+    return upload_state
+
+def render_metrics_panel():
+    """Panel metrik di sidebar (hanya jika instrumentasi aktif)"""
+    if not METRICS.enabled:
+        return
+    snapshot = METRICS.snapshot()
+    with st.expander("📈 Metrik Performa"):
+        if snapshot['stages']:
+            st.dataframe(
+                [
+                    {'Tahap': stage, 'Jumlah': data['count'], 'Rata-rata (ms)': round(data['mean_ms'], 1)}
+                    for stage, data in snapshot['stages'].items()
+                ],
+                hide_index=True
+            )
+        for name, values in snapshot['counters'].items():
+            st.write(f"**{name}:** " + ", ".join(f"{label}={value:g}" for label, value in values.items()))
+        st.download_button("Unduh metrik (Prometheus)", METRICS.to_prometheus(), file_name="metrics.prom")
 
 def main():
     st.title("🐾 Pet Product Safety Analyzer")
@@ -41,10 +84,12 @@ def main():
         - Makanan ringan
         - Suplemen & obat luar
         """)
+        
+        render_metrics_panel()
     
     # Load analyzer
     analyzer = load_analyzer()
-    image_processor = ImageProcessor()
+    image_processor = load_image_processor()
     
     # Upload gambar
     st.header("📤 Upload Gambar Produk")
@@ -55,33 +100,43 @@ def main():
     )
     
     if uploaded_file is not None:
+        upload_state = get_upload_state(uploaded_file.getvalue())
+        
         # Tampilkan gambar asli
         col1, col2 = st.columns([1, 1])
         
         with col1:
             st.subheader("🖼️ Gambar Asli")
-            image = Image.open(uploaded_file)
+            if 'image' not in upload_state:
+                upload_state['image'] = Image.open(io.BytesIO(uploaded_file.getvalue()))
+            image = upload_state['image']
             st.image(image, caption="Gambar yang diupload", use_column_width=True)
         
         with col2:
             st.subheader("🔍 Preprocessing")
-            # Proses gambar
-            processed_image = image_processor.preprocess_image(np.array(image))
+            # Proses gambar (sekali per upload, dipakai ulang untuk OCR)
+            if 'processed_image' not in upload_state:
+                upload_state['processed_image'] = image_processor.preprocess_image(np.array(image))
+            processed_image = upload_state['processed_image']
             st.image(processed_image, caption="Gambar setelah preprocessing", use_column_width=True)
         
-        # Tombol untuk memproses
-        if st.button("🔬 Analisis Produk", type="primary"):
+        # Tombol untuk memproses (hasil sebelumnya tetap ditampilkan saat rerun)
+        if st.button("🔬 Analisis Produk", type="primary") or 'ocr_text' in upload_state:
             with st.spinner("Sedang menganalisis gambar..."):
                 # OCR
                 st.header("📝 Hasil OCR")
-                ocr_text = image_processor.extract_text(np.array(image))
+                if 'ocr_text' not in upload_state:
+                    upload_state['ocr_text'] = image_processor.extract_text(processed_image, preprocess=False)
+                ocr_text = upload_state['ocr_text']
                 
                 if ocr_text.strip():
                     st.text_area("Teks yang diekstrak:", ocr_text, height=150)
                     
                     # Analisis bahan
                     st.header("🧪 Analisis Bahan")
-                    analysis = analyzer.analyze_ingredients(ocr_text)
+                    if 'analysis' not in upload_state:
+                        upload_state['analysis'] = analyzer.analyze_ingredients(ocr_text)
+                    analysis = upload_state['analysis']
                     
                     # Tampilkan hasil dalam 3 kolom
                     col1, col2, col3 = st.columns(3)
@@ -122,6 +177,13 @@ def main():
                             for ingredient in analysis['unknown']:
                                 st.write(f"• {ingredient}")
                     
+                    # Bahan yang cocok secara fuzzy (kemungkinan salah baca OCR)
+                    if analysis.get('fuzzy'):
+                        st.info("🔎 **Kemungkinan Bahan (koreksi OCR):**")
+                        for match in analysis['fuzzy']:
+                            st.write(f"• {match['found_in']} → **{match['name']}** "
+                                     f"({match['category']}, skor {match['score']:.2f})")
+                    
                     # Rekomendasi
                     st.header("💡 Rekomendasi")
                     recommendation = analyzer.get_recommendation(analysis)
@@ -0,0 +1,49 @@
+"""
+Import lazy untuk dependency berat (cv2, numpy, pytesseract, requests, PIL, ...)
+
+Modul baru benar-benar di-import saat atributnya pertama kali diakses, sehingga
+entry point yang hanya butuh analisis teks (analyzer, bulk CLI, HTTP service)
+tidak membayar biaya import OpenCV/Tesseract saat start.
+
+    cv2 = lazy_import('cv2')
+    cv2.resize(...)          # import terjadi di sini
+"""
+
+import importlib
+import threading
+
+_import_lock = threading.Lock()
+
+class LazyModule:
+    """Proxy modul yang meng-import modul aslinya saat atribut pertama diakses"""
+
+    def __init__(self, name: str):
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with _import_lock:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_lazy_name'])
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._load(), attr)
+        # Simpan di proxy agar akses berikutnya secepat atribut biasa
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_lazy_name']}' ({state})>"
+
+def lazy_import(name: str) -> LazyModule:
+    """Buat proxy lazy untuk modul name"""
+    return LazyModule(name)
@@ -0,0 +1,167 @@
+"""
+Instrumentasi metrik untuk Pet Product Safety Analyzer
+Latency per tahap (histogram), counter throughput, cache hit/miss, dan error
+
+Nonaktif secara default (overhead hampir nol). Aktifkan dengan:
+    METRICS.enable()            atau environment variable PET_ANALYZER_METRICS=1
+
+Ekspor:
+    METRICS.to_prometheus()     format text exposition Prometheus
+    METRICS.snapshot()          dictionary (JSON)
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Tuple
+
+# Batas bucket histogram latency (detik)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class MetricsRegistry:
+    """Registry metrik sederhana (thread-safe) tanpa dependency tambahan"""
+
+    def __init__(self, enabled: bool = False, prefix: str = "pet_analyzer"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def observe(self, stage: str, seconds: float):
+        """Catat satu sampel latency untuk tahap tertentu"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+                self._histograms[stage] = histogram
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    def inc(self, name: str, label: str = "", amount: float = 1):
+        """Tambah counter (mis. inc('errors', 'ocr'), inc('cache_hits', 'ocr'))"""
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (name, label)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Context manager untuk mengukur latency satu tahap"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        """Decorator untuk mengukur latency fungsi/method"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def drain(self) -> Dict:
+        """Ambil lalu kosongkan metrik (untuk dikirim dari worker process ke parent)"""
+        with self._lock:
+            data = {'histograms': self._histograms, 'counters': list(self._counters.items())}
+            self._histograms = {}
+            self._counters = {}
+        return data
+
+    def merge(self, data: Dict):
+        """Gabungkan metrik hasil drain() dari proses lain"""
+        if not self.enabled or not data:
+            return
+        with self._lock:
+            for stage, other in data['histograms'].items():
+                histogram = self._histograms.setdefault(
+                    stage, {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+                )
+                histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+                histogram['count'] += other['count']
+                histogram['sum'] += other['sum']
+            for key, value in data['counters']:
+                key = tuple(key)
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> Dict:
+        """Snapshot metrik dalam bentuk dictionary (JSON-serializable)"""
+        with self._lock:
+            stages = {}
+            for stage, histogram in self._histograms.items():
+                count = histogram['count']
+                stages[stage] = {
+                    'count': count,
+                    'sum_seconds': histogram['sum'],
+                    'mean_ms': histogram['sum'] / count * 1000 if count else 0.0,
+                    'buckets': {str(bound): value for bound, value in zip(LATENCY_BUCKETS, histogram['buckets'])}
+                }
+            counters = {}
+            for (name, label), value in self._counters.items():
+                counters.setdefault(name, {})[label or 'total'] = value
+        return {'enabled': self.enabled, 'timestamp': time.time(), 'stages': stages, 'counters': counters}
+
+    def to_prometheus(self) -> str:
+        """Metrik dalam format text exposition Prometheus"""
+        lines = []
+        name = f"{self.prefix}_stage_latency_seconds"
+        with self._lock:
+            if self._histograms:
+                lines.append(f"# HELP {name} Latency per tahap pemrosesan")
+                lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, value in zip(LATENCY_BUCKETS, histogram['buckets']):
+                    cumulative += value
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+
+            counter_names = sorted({counter for counter, _ in self._counters})
+            for counter in counter_names:
+                full_name = f"{self.prefix}_{counter}_total"
+                lines.append(f"# TYPE {full_name} counter")
+                for (other, label), value in sorted(self._counters.items()):
+                    if other != counter:
+                        continue
+                    if label:
+                        lines.append(f'{full_name}{{component="{label}"}} {value}')
+                    else:
+                        lines.append(f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+# Registry global yang dipakai semua komponen
+METRICS = MetricsRegistry(enabled=os.environ.get("PET_ANALYZER_METRICS", "") not in ("", "0"))
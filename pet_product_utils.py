@@ -1,36 +1,215 @@
-import cv2
-import numpy as np
-import pytesseract
+from __future__ import annotations
+
 import re
 import json
-from typing import Dict, List, Tuple
+import os
+import pickle
+import hashlib
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pet_product_lazy import lazy_import
+from pet_product_metrics import METRICS
+
+# Dependency berat baru di-import saat fitur gambar/OCR/knowledge base pertama kali dipakai
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+pytesseract = lazy_import('pytesseract')
+
+# Konfigurasi OCR (dipakai oleh semua backend)
+OCR_LANG = 'eng'
+OCR_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789()[]{}.,;:-_+%/ '
+TESSERACT_CONFIG = r'--oem 3 --psm 6 -c tessedit_char_whitelist=' + OCR_WHITELIST
+
+# Eskalasi OCR adaptif, urut dari yang termurah: (nama, varian gambar, PSM)
+ADAPTIVE_ESCALATIONS = [
+    ('alt_psm', 'binary', 4),
+    ('clahe', 'clahe', 6),
+    ('denoise', 'denoise', 6),
+]
+
+# Naikkan jika preprocess_image berubah agar cache OCR lama tidak dipakai
+PREPROCESS_VERSION = 2
+
+class OCRCache:
+    """
+    Cache hasil OCR di disk, dialamatkan dengan hash konten gambar
+    Ukuran dibatasi (max_bytes) dengan eviksi LRU berdasarkan mtime file
+    """
+    
+    def __init__(self, cache_dir: str = ".ocr_cache", max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._approx_size = self._scan_size()
+    
+    def make_key(self, image: np.ndarray, signature: str) -> str:
+        """Hash dari piksel hasil decode + konfigurasi preprocessing/OCR"""
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.shape}|{image.dtype}|{signature}".encode('utf-8'))
+        digest.update(image.data)
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+    
+    def get(self, key: str) -> Optional[str]:
+        """Ambil teks dari cache, None jika tidak ada"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            METRICS.inc('cache_misses', 'ocr')
+            return None
+        
+        # Tandai sebagai baru dipakai (untuk LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        METRICS.inc('cache_hits', 'ocr')
+        return text
+    
+    def put(self, key: str, text: str):
+        """Simpan teks ke cache (tulis ke file sementara lalu rename atomik)"""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error menulis cache OCR: {e}")
+            METRICS.inc('errors', 'ocr_cache')
+            return
+        
+        self._approx_size += len(text.encode('utf-8'))
+        if self._approx_size > self.max_bytes:
+            self.evict()
+    
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """Daftar (mtime, ukuran, path) semua entry cache"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Sudah dihapus oleh proses lain
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+    
+    def evict(self):
+        """Hapus entry paling lama tidak dipakai sampai ukuran di bawah 90% batas"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._approx_size = total
+    
+    def stats(self) -> Dict[str, float]:
+        """Statistik hit/miss cache"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size_bytes': self._approx_size
+        }
 
 class ImageProcessor:
     """Kelas untuk pemrosesan gambar dan OCR"""
     
-    def __init__(self):
+    def __init__(self, ocr_backend: str = 'pytesseract', ocr_cache: Optional[OCRCache] = None,
+                 use_roi: bool = False, roi_workers: int = 4,
+                 resolution_mode: str = 'normalize', target_char_height: int = 24,
+                 adaptive: bool = False, min_confidence: float = 75.0, ocr_time_budget: float = 2.0):
         # Konfigurasi Tesseract (sesuaikan path jika diperlukan)
         # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'  # Windows
-        pass
+        
+        # Backend OCR: 'pytesseract' (proses baru per panggilan) atau
+        # 'tesserocr' (API Tesseract tetap dimuat per thread, opsional)
+        self.ocr_backend = ocr_backend
+        self._engine_local = threading.local()
+        self._engine_available = ocr_backend == 'tesserocr'
+        self.ocr_cache = ocr_cache
+        
+        # Mode ROI: OCR hanya area label, crop diproses paralel dengan roi_workers thread
+        self.use_roi = use_roi
+        self.roi_workers = roi_workers
+        
+        # Normalisasi resolusi: 'normalize' (resize ke tinggi karakter target, naik/turun)
+        # atau 'legacy' (hanya upscale gambar dengan lebar < 800px)
+        self.resolution_mode = resolution_mode
+        self.target_char_height = target_char_height
+        self.last_scale = 1.0
+        
+        # OCR adaptif: pass cepat dulu, gambar/baris dengan confidence < min_confidence
+        # dieskalasi (PSM lain, CLAHE, denoise) selama masih dalam ocr_time_budget detik
+        self.adaptive = adaptive
+        self.min_confidence = min_confidence
+        self.ocr_time_budget = ocr_time_budget
+        self.last_ocr_report = None
+        self._enhancer = None
+    
+    def __getstate__(self):
+        # Handle Tesseract tidak bisa di-pickle; worker membuat handle sendiri
+        state = self.__dict__.copy()
+        del state['_engine_local']
+        return state
     
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._engine_local = threading.local()
+    
+    @METRICS.timed('preprocess_image')
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """
         Preprocessing gambar untuk meningkatkan akurasi OCR
         """
+        return self._binarize(self._scaled_gray(image))
+    
+    def _scaled_gray(self, image: np.ndarray) -> np.ndarray:
+        """Grayscale + normalisasi resolusi (scale yang dipakai disimpan di self.last_scale)"""
         # Convert ke grayscale jika berwarna
         if len(image.shape) == 3:
             gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         else:
             gray = image.copy()
         
-        # Resize jika terlalu kecil
-        height, width = gray.shape
-        if width < 800:
-            scale = 800 / width
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            gray = cv2.resize(gray, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-        
+        if self.resolution_mode == 'legacy':
+            gray, self.last_scale = self._resize_legacy(gray)
+        else:
+            gray, self.last_scale = self.normalize_resolution(gray)
+        return gray
+    
+    def _binarize(self, gray: np.ndarray) -> np.ndarray:
+        """Blur, threshold Otsu, lalu bersihkan noise kecil"""
         # Gaussian blur untuk mengurangi noise
         blurred = cv2.GaussianBlur(gray, (3, 3), 0)
         
@@ -43,6 +222,79 @@ class ImageProcessor:
         
         return cleaned
     
+    def _resize_legacy(self, gray: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Resize lama: upscale jika lebar < 800px"""
+        height, width = gray.shape
+        if width < 800:
+            scale = 800 / width
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+            return cv2.resize(gray, (new_width, new_height), interpolation=cv2.INTER_CUBIC), scale
+        return gray, 1.0
+    
+    def estimate_text_height(self, gray: np.ndarray) -> Optional[float]:
+        """
+        Estimasi tinggi karakter (px) dari connected component pada thumbnail
+        Returns: median tinggi karakter pada resolusi asli, None jika tidak bisa diestimasi
+        """
+        height, width = gray.shape
+        thumb_scale = min(1.0, 1000 / max(height, width))
+        if thumb_scale < 1.0:
+            thumb = cv2.resize(gray, (max(1, int(width * thumb_scale)), max(1, int(height * thumb_scale))),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            thumb = gray
+        
+        _, binary = cv2.threshold(thumb, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        # Teks dianggap sebagai piksel minoritas
+        if cv2.countNonZero(binary) > binary.size / 2:
+            binary = cv2.bitwise_not(binary)
+        
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        comp_w = stats[1:, cv2.CC_STAT_WIDTH]
+        comp_h = stats[1:, cv2.CC_STAT_HEIGHT]
+        comp_area = stats[1:, cv2.CC_STAT_AREA]
+        
+        # Filter komponen yang bentuknya mirip karakter
+        mask = (comp_h >= 4) & (comp_h <= thumb.shape[0] * 0.2) & (comp_w <= comp_h * 3) & (comp_area >= 8)
+        if np.count_nonzero(mask) < 10:
+            return None
+        
+        return float(np.median(comp_h[mask])) / thumb_scale
+    
+    def normalize_resolution(self, gray: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Resize gambar agar tinggi karakter mendekati target_char_height
+        Downscale memakai INTER_AREA, upscale memakai INTER_CUBIC
+        Returns: (gambar, scale yang dipakai)
+        """
+        height, width = gray.shape
+        text_height = self.estimate_text_height(gray)
+        
+        if text_height is None:
+            # Tidak bisa diestimasi: batasi ukuran ke lebar 800-2000px
+            if width < 800:
+                scale = 800 / width
+            elif width > 2000:
+                scale = 2000 / width
+            else:
+                scale = 1.0
+        else:
+            scale = self.target_char_height / text_height
+        
+        # Batasi agar sisi terpanjang tetap wajar
+        scale = min(scale, 4000 / max(height, width))
+        scale = max(scale, 400 / max(height, width))
+        
+        # Perubahan kecil tidak sebanding dengan biaya resize
+        if 0.9 <= scale <= 1.1:
+            return gray, 1.0
+        
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(gray, new_size, interpolation=interpolation), scale
+    
+    @METRICS.timed('detect_label_area')
     def detect_label_area(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
         Deteksi area label menggunakan contour detection (opsional)
@@ -70,32 +322,779 @@ class ImageProcessor:
         
         return label_areas
     
-    def extract_text(self, image: np.ndarray, preprocess: bool = True) -> str:
+    def merge_label_areas(self, boxes: List[Tuple[int, int, int, int]],
+                          padding: int = 10) -> List[Tuple[int, int, int, int]]:
         """
-        Ekstraksi teks menggunakan OCR
+        Gabungkan bounding box yang saling overlap (termasuk box di dalam box lain)
+        Returns: box hasil merge, urut sesuai urutan baca (atas-bawah, kiri-kanan)
         """
+        merged = [(x - padding, y - padding, x + w + padding, y + h + padding) for x, y, w, h in boxes]
+        
+        changed = True
+        while changed:
+            changed = False
+            result = []
+            for box in merged:
+                for i, other in enumerate(result):
+                    if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]:
+                        result[i] = (min(box[0], other[0]), min(box[1], other[1]),
+                                     max(box[2], other[2]), max(box[3], other[3]))
+                        changed = True
+                        break
+                else:
+                    result.append(box)
+            merged = result
+        
+        regions = [(max(x1, 0), max(y1, 0), x2 - max(x1, 0), y2 - max(y1, 0)) for x1, y1, x2, y2 in merged]
+        return self._sort_reading_order(regions)
+    
+    def _sort_reading_order(self, boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        """Urutkan box per baris (berdasarkan y), lalu dari kiri ke kanan"""
+        if not boxes:
+            return []
+        
+        boxes = sorted(boxes, key=lambda box: box[1])
+        rows = [[boxes[0]]]
+        for box in boxes[1:]:
+            row_top = rows[-1][0][1]
+            row_height = min(b[3] for b in rows[-1])
+            # Box yang mulai di paruh atas baris yang sama dianggap satu baris
+            if box[1] < row_top + row_height / 2:
+                rows[-1].append(box)
+            else:
+                rows.append([box])
+        return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+    
+    def _extract_text_roi(self, image: np.ndarray, preprocess: bool) -> str:
+        """
+        OCR hanya pada area label yang terdeteksi (crop diproses paralel)
+        Kembali ke OCR satu frame penuh jika tidak ada area yang ditemukan
+        """
+        regions = self.merge_label_areas(self.detect_label_area(image))
+        if not regions:
+            return self._ocr_single(image, preprocess)
+        
+        def ocr_region(region: Tuple[int, int, int, int]) -> str:
+            x, y, w, h = region
+            return self._ocr_single(image[y:y + h, x:x + w], preprocess)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.roi_workers, len(regions)))) as executor:
+            texts = list(executor.map(ocr_region, regions))
+        
+        return "\n".join(text for text in texts if text)
+    
+    def _get_engine(self):
+        """
+        Ambil handle Tesseract API untuk thread ini (dibuat sekali lalu dipakai ulang)
+        Returns: PyTessBaseAPI, atau None jika tesserocr tidak tersedia
+        """
+        if not self._engine_available:
+            return None
+        
+        engine = getattr(self._engine_local, 'engine', None)
+        if engine is not None:
+            return engine
+        
+        try:
+            from tesserocr import PyTessBaseAPI, OEM, PSM
+            
+            # Sama dengan --oem 3 --psm 6 + whitelist
+            engine = PyTessBaseAPI(lang=OCR_LANG, oem=OEM.DEFAULT, psm=PSM.SINGLE_BLOCK)
+            engine.SetVariable('tessedit_char_whitelist', OCR_WHITELIST)
+        except ImportError:
+            print("tesserocr tidak terinstall, kembali ke pytesseract. Install dengan: pip install tesserocr")
+            self._engine_available = False
+            return None
+        except Exception as e:
+            print(f"Error inisialisasi Tesseract API, kembali ke pytesseract: {e}")
+            self._engine_available = False
+            return None
+        
+        self._engine_local.engine = engine
+        return engine
+    
+    def _ocr_with_engine(self, engine, image: np.ndarray) -> str:
+        """OCR langsung dari buffer numpy tanpa file sementara"""
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        engine.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+        return engine.GetUTF8Text()
+    
+    @METRICS.timed('ocr')
+    def _run_ocr(self, processed_image: np.ndarray) -> str:
+        """Jalankan OCR dengan backend yang dipilih"""
+        engine = self._get_engine()
+        if engine is not None:
+            return self._ocr_with_engine(engine, processed_image)
+        return pytesseract.image_to_string(processed_image, config=TESSERACT_CONFIG, lang=OCR_LANG)
+    
+    def _ocr_lines(self, image: np.ndarray, psm: int = 6) -> List[Dict]:
+        """
+        OCR dengan confidence per baris
+        Returns: list {'text', 'confidence' (0-100, rata-rata kata), 'box' (x, y, w, h)}
+        """
+        engine = self._get_engine()
+        if engine is not None:
+            from tesserocr import RIL, iterate_level
+            
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            height, width = image.shape[:2]
+            bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+            engine.SetPageSegMode(psm)
+            try:
+                engine.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+                engine.Recognize()
+                lines = []
+                for result in iterate_level(engine.GetIterator(), RIL.TEXTLINE):
+                    text = (result.GetUTF8Text(RIL.TEXTLINE) or "").strip()
+                    if text:
+                        x1, y1, x2, y2 = result.BoundingBox(RIL.TEXTLINE)
+                        lines.append({'text': text, 'confidence': result.Confidence(RIL.TEXTLINE),
+                                      'box': (x1, y1, x2 - x1, y2 - y1)})
+                return lines
+            finally:
+                engine.SetPageSegMode(6)
+        
+        config = TESSERACT_CONFIG.replace('--psm 6', f'--psm {psm}')
+        data = pytesseract.image_to_data(image, config=config, lang=OCR_LANG,
+                                         output_type=pytesseract.Output.DICT)
+        grouped = {}
+        for i, word in enumerate(data['text']):
+            word = word.strip()
+            confidence = float(data['conf'][i])
+            if not word or confidence < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            box = (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+            line = grouped.get(key)
+            if line is None:
+                grouped[key] = {'words': [word], 'confs': [confidence], 'box': box}
+                continue
+            line['words'].append(word)
+            line['confs'].append(confidence)
+            x, y, w, h = line['box']
+            x2 = max(x + w, box[0] + box[2])
+            y2 = max(y + h, box[1] + box[3])
+            x, y = min(x, box[0]), min(y, box[1])
+            line['box'] = (x, y, x2 - x, y2 - y)
+        
+        return [{'text': ' '.join(line['words']), 'confidence': sum(line['confs']) / len(line['confs']),
+                 'box': line['box']} for line in grouped.values()]
+    
+    def _mean_confidence(self, lines: List[Dict]) -> float:
+        """Rata-rata confidence berbobot panjang teks (0 jika tidak ada teks)"""
+        total = sum(len(line['text']) for line in lines)
+        if not total:
+            return 0.0
+        return sum(line['confidence'] * len(line['text']) for line in lines) / total
+    
+    def _escalation_image(self, variant: str, gray: np.ndarray, binary: np.ndarray,
+                          time_budget: Optional[float] = None) -> Optional[np.ndarray]:
+        """Gambar untuk satu strategi eskalasi (None jika strategi tidak tersedia)"""
+        if variant == 'binary':
+            return binary
+        if variant == 'clahe':
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            return self._binarize(clahe.apply(gray))
+        if variant == 'denoise':
+            if self._enhancer is None:
+                try:
+                    from advanced_features import AdvancedImageProcessor
+                except ImportError:
+                    return None
+                # Dipakai ulang agar kalibrasi biaya tier denoising terbawa antar gambar
+                self._enhancer = AdvancedImageProcessor()
+            return self._binarize(self._enhancer.enhance_image_quality(gray, time_budget=time_budget))
+        raise ValueError(f"Varian eskalasi tidak dikenal: {variant}")
+    
+    def _extract_text_adaptive(self, image: np.ndarray, preprocess: bool) -> str:
+        """
+        OCR adaptif dengan early exit
+        1. Pass cepat (preprocess standar, PSM 6) + confidence per baris
+        2. Jika semua baris yakin: selesai
+        3. Jika hanya sebagian kecil baris yang ragu: hanya crop baris tersebut yang dieskalasi (PSM 7)
+        4. Selain itu seluruh gambar dieskalasi, hasil dengan confidence tertinggi dipakai
+        Eskalasi berhenti begitu confidence cukup atau ocr_time_budget habis
+        """
+        start = time.perf_counter()
+        deadline = start + self.ocr_time_budget
+        
         if preprocess:
-            processed_image = self.preprocess_image(image)
+            with METRICS.timer('preprocess_image'):
+                gray = self._scaled_gray(image)
+                binary = self._binarize(gray)
         else:
-            processed_image = image
+            gray = binary = image
+        
+        with METRICS.timer('ocr'):
+            lines = self._ocr_lines(binary)
+        attempt_seconds = time.perf_counter() - start
+        confidence = self._mean_confidence(lines)
+        report = {'strategy': 'fast', 'confidence': confidence, 'attempts': 1, 'budget_exhausted': False}
+        
+        # Tanpa preprocess, gambar dianggap sudah biner: hanya PSM lain yang masuk akal
+        escalations = ADAPTIVE_ESCALATIONS if preprocess else [e for e in ADAPTIVE_ESCALATIONS if e[1] == 'binary']
+        
+        def has_budget() -> bool:
+            # Jangan mulai percobaan yang diperkirakan melewati budget
+            if deadline - time.perf_counter() < attempt_seconds:
+                report['budget_exhausted'] = True
+                return False
+            return True
+        
+        def remaining_budget() -> float:
+            # Sisakan waktu untuk OCR setelah enhancement
+            return max(0.0, deadline - time.perf_counter() - attempt_seconds)
         
-        # Konfigurasi OCR
-        custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789()[]{}.,;:-_+%/ '
+        low = [line for line in lines if line['confidence'] < self.min_confidence]
+        total_area = sum(line['box'][2] * line['box'][3] for line in lines)
+        low_area = sum(line['box'][2] * line['box'][3] for line in low)
+        
+        if low and len(lines) > 1 and low_area <= total_area * 0.5:
+            # Eskalasi per baris
+            report['strategy'] = 'region'
+            height, width = gray.shape[:2]
+            for line in low:
+                x, y, w, h = line['box']
+                pad = max(4, h // 4)
+                y1, y2 = max(0, y - pad), min(height, y + h + pad)
+                x1, x2 = max(0, x - pad), min(width, x + w + pad)
+                crop_gray, crop_binary = gray[y1:y2, x1:x2], binary[y1:y2, x1:x2]
+                for name, variant, _ in escalations:
+                    if not has_budget():
+                        break
+                    crop = self._escalation_image(variant, crop_gray, crop_binary, remaining_budget())
+                    if crop is None:
+                        continue
+                    with METRICS.timer('ocr_escalation'):
+                        candidate = self._ocr_lines(crop, psm=7)
+                    report['attempts'] += 1
+                    candidate_confidence = self._mean_confidence(candidate)
+                    if candidate_confidence > line['confidence']:
+                        line['text'] = ' '.join(c['text'] for c in candidate)
+                        line['confidence'] = candidate_confidence
+                    if line['confidence'] >= self.min_confidence:
+                        break
+            confidence = self._mean_confidence(lines)
+        elif confidence < self.min_confidence:
+            # Eskalasi seluruh gambar
+            for name, variant, psm in escalations:
+                if not has_budget():
+                    break
+                escalated = self._escalation_image(variant, gray, binary, remaining_budget())
+                if escalated is None:
+                    continue
+                with METRICS.timer('ocr_escalation'):
+                    candidate = self._ocr_lines(escalated, psm=psm)
+                report['attempts'] += 1
+                candidate_confidence = self._mean_confidence(candidate)
+                if candidate_confidence > confidence:
+                    lines, confidence = candidate, candidate_confidence
+                    report['strategy'] = name
+                if confidence >= self.min_confidence:
+                    break
+        
+        report['confidence'] = confidence
+        report['elapsed'] = time.perf_counter() - start
+        self.last_ocr_report = report
+        METRICS.inc('ocr_adaptive', report['strategy'])
+        if report['budget_exhausted']:
+            METRICS.inc('ocr_adaptive', 'budget_exhausted')
+        return "\n".join(line['text'] for line in lines)
+    
+    def _ocr_single(self, image: np.ndarray, preprocess: bool) -> str:
+        """OCR satu gambar/crop (adaptif jika diaktifkan)"""
+        if self.adaptive:
+            return self._extract_text_adaptive(image, preprocess)
+        processed_image = self.preprocess_image(image) if preprocess else image
+        return self._run_ocr(processed_image).strip()
+    
+    def _cache_signature(self, preprocess: bool, use_roi: bool = False) -> str:
+        """Konfigurasi yang mempengaruhi hasil OCR (bagian dari key cache)"""
+        return (f"{self.ocr_backend}|{TESSERACT_CONFIG}|{OCR_LANG}|"
+                f"preprocess={preprocess}:{PREPROCESS_VERSION}:{self.resolution_mode}:{self.target_char_height}|"
+                f"roi={use_roi}|adaptive={self.adaptive}:{self.min_confidence}")
+    
+    @METRICS.timed('extract_text')
+    def extract_text(self, image: np.ndarray, preprocess: bool = True, use_roi: Optional[bool] = None) -> str:
+        """
+        Ekstraksi teks menggunakan OCR
+        use_roi=True hanya meng-OCR area label dari detect_label_area (default: self.use_roi)
+        """
+        if use_roi is None:
+            use_roi = self.use_roi
+        
+        cache_key = None
+        if self.ocr_cache is not None:
+            cache_key = self.ocr_cache.make_key(image, self._cache_signature(preprocess, use_roi))
+            cached_text = self.ocr_cache.get(cache_key)
+            if cached_text is not None:
+                return cached_text
         
         try:
             # Ekstraksi teks
-            text = pytesseract.image_to_string(processed_image, config=custom_config, lang='eng')
-            return text.strip()
+            if use_roi:
+                text = self._extract_text_roi(image, preprocess)
+            else:
+                text = self._ocr_single(image, preprocess)
         except Exception as e:
             print(f"Error dalam OCR: {e}")
+            METRICS.inc('errors', 'ocr')
             return ""
+        
+        if cache_key is not None:
+            self.ocr_cache.put(cache_key, text)
+        return text
+
+class IngredientMatcher:
+    """
+    Pencocokan banyak pola sekaligus (Aho-Corasick)
+    Automaton dibangun sekali, lalu setiap teks cukup di-scan satu kali
+    """
+    
+    def __init__(self, patterns: List[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._build()
+    
+    def _build(self):
+        """Bangun trie, failure link, dan output tiap state"""
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].append(index)
+        
+        # BFS untuk failure link
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    
+    def find(self, text: str) -> List[int]:
+        """
+        Cari semua pola yang muncul di teks
+        Returns: indeks pola (urut sesuai urutan pola) yang ditemukan
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return sorted(found)
+    
+    def finditer(self, text: str):
+        """
+        Scan teks sekali dan hasilkan setiap kemunculan pola
+        Yields: (start, end, indeks pola) urut berdasarkan posisi akhir
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        patterns = self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position + 1 - len(patterns[index]), position + 1, index
+
+def bounded_edit_distance(a: str, b: str, max_edits: int) -> int:
+    """
+    Levenshtein distance dengan batas max_edits (DP berpita, berhenti lebih awal)
+    Returns: jarak edit, atau max_edits + 1 jika melebihi batas
+    """
+    if abs(len(a) - len(b)) > max_edits:
+        return max_edits + 1
+    if len(a) > len(b):
+        a, b = b, a
+    
+    limit = max_edits + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [limit] * (len(b) + 1)
+        current[0] = i
+        start = max(1, i - max_edits)
+        end = min(len(b), i + max_edits)
+        char_a = a[i - 1]
+        row_min = current[0] if start == 1 else limit
+        for j in range(start, end + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value if value < limit else limit
+            if current[j] < row_min:
+                row_min = current[j]
+        if row_min > max_edits:
+            return limit
+        previous = current
+    return previous[len(b)] if previous[len(b)] <= max_edits else limit
+
+class FuzzyIngredientIndex:
+    """
+    Indeks fuzzy untuk nama bahan (posting trigram per panjang string)
+    Kandidat disaring dengan filter panjang dan jumlah trigram yang sama,
+    lalu diverifikasi dengan bounded_edit_distance
+    """
+    
+    def __init__(self, aliases: List[str], max_edits: int = 2):
+        self.aliases = list(aliases)
+        self.max_edits = max_edits
+        self._postings: Dict[Tuple[str, int], List[int]] = {}
+        self._by_length: Dict[int, List[int]] = {}
+        for index, alias in enumerate(self.aliases):
+            self._by_length.setdefault(len(alias), []).append(index)
+            for gram in set(self._trigrams(alias)):
+                self._postings.setdefault((gram, len(alias)), []).append(index)
+    
+    def _trigrams(self, text: str) -> List[str]:
+        padded = f"  {text} "
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+    
+    def allowed_edits(self, length: int) -> int:
+        """Jumlah edit yang diizinkan sesuai panjang token (token pendek harus exact)"""
+        if length < 5:
+            return 0
+        if length < 9:
+            return min(1, self.max_edits)
+        return self.max_edits
+    
+    def lookup(self, token: str) -> Optional[Tuple[int, int, float]]:
+        """
+        Cari alias terbaik dalam batas edit
+        Returns: (indeks alias, jarak edit, skor 0-1), atau None
+        """
+        max_edits = self.allowed_edits(len(token))
+        if max_edits == 0:
+            return None
+        
+        grams = set(self._trigrams(token))
+        # Setiap edit merusak paling banyak 3 trigram
+        min_shared = len(grams) - 3 * max_edits
+        
+        candidates: Dict[int, int] = {}
+        for length in range(len(token) - max_edits, len(token) + max_edits + 1):
+            if min_shared <= 0:
+                for index in self._by_length.get(length, []):
+                    candidates[index] = 1
+                continue
+            for gram in grams:
+                for index in self._postings.get((gram, length), ()):
+                    candidates[index] = candidates.get(index, 0) + 1
+        
+        best = None
+        for index, shared in candidates.items():
+            if shared < min_shared:
+                continue
+            distance = bounded_edit_distance(token, self.aliases[index], max_edits)
+            if distance > max_edits:
+                continue
+            if best is None or distance < best[1] or (distance == best[1] and index < best[0]):
+                best = (index, distance)
+                if distance == 0:
+                    break
+        
+        if best is None:
+            return None
+        index, distance = best
+        return index, distance, 1.0 - distance / max(len(token), len(self.aliases[index]))
+
+# Judul bagian pada label (Inggris + Indonesia) -> nama bagian kanonis
+LABEL_SECTION_HEADINGS = {
+    'ingredients': ['ingredients', 'ingredient', 'bahan-bahan', 'bahan aktif', 'bahan', 'kandungan'],
+    'composition': ['composition', 'komposisi'],
+    'contents': ['contents', 'content'],
+    'directions': ['directions', 'direction', 'instructions', 'instruction',
+                   'cara pakai', 'aturan pakai', 'petunjuk penggunaan'],
+    'warnings': ['warnings', 'warning', 'caution', 'peringatan', 'perhatian'],
+}
+
+# Kata umum yang juga muncul di dalam kalimat/daftar bahan ("content of aloe vera",
+# "ekstrak bahan alami"): hanya dianggap judul jika diikuti ':' di awal baris/kalimat
+WEAK_SECTION_HEADINGS = {'content', 'contents', 'bahan', 'kandungan'}
+
+# Kata sebelum judul yang ikut menjadi bagian judul ("Inactive ingredients:")
+SECTION_HEADING_QUALIFIERS = {'active', 'inactive', 'other'}
+
+# Urutan prioritas bagian yang berisi daftar bahan
+INGREDIENT_SECTIONS = ('ingredients', 'composition', 'contents')
+
+_section_matcher = None
+_section_names: List[str] = []
+
+def _get_section_matcher() -> IngredientMatcher:
+    global _section_matcher
+    if _section_matcher is None:
+        headings = []
+        for section, keywords in LABEL_SECTION_HEADINGS.items():
+            for keyword in keywords:
+                headings.append(keyword)
+                _section_names.append(section)
+        _section_matcher = IngredientMatcher(headings)
+    return _section_matcher
+
+def _heading_prefix(lowered: str, start: int) -> Tuple[int, str]:
+    """Posisi awal judul (termasuk kata qualifier) dan karakter penting sebelum judul"""
+    position = start
+    while position > 0 and lowered[position - 1] in ' \t':
+        position -= 1
+    word_start = position
+    while word_start > 0 and lowered[word_start - 1].isalpha():
+        word_start -= 1
+    if word_start < position and lowered[word_start:position] in SECTION_HEADING_QUALIFIERS:
+        start = position = word_start
+        while position > 0 and lowered[position - 1] in ' \t':
+            position -= 1
+    # Bullet di awal baris tidak dihitung
+    while position > 0 and lowered[position - 1] in '-*•·':
+        position -= 1
+    while position > 0 and lowered[position - 1] in ' \t':
+        position -= 1
+    previous = lowered[position - 1] if position > 0 else '\n'
+    return start, previous
+
+def parse_label_sections(text: str) -> List[Dict]:
+    """
+    Pecah teks label menjadi bagian-bagian (ingredients, directions, warnings, ...)
+    dalam satu kali scan, tanpa backtracking regex
+    Judul hanya dikenali di awal baris atau jika diikuti ':', jadi text harus
+    teks mentah (sebelum clean_label_text menghapus baris dan tanda baca)
+    Returns: list bagian berurutan dengan offset karakter terhadap text:
+        section, heading, start (awal judul), content_start, end
+    """
+    matcher = _get_section_matcher()
+    # lower() per karakter agar offset tetap sama dengan teks asli
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(char if len(char.lower()) != 1 else char.lower() for char in text)
+    length = len(lowered)
+
+    # Kumpulkan judul utuh (batas kata di kedua sisi), pilih yang paling kiri lalu terpanjang
+    headings = []
+    for start, end, index in matcher.finditer(lowered):
+        if start > 0 and lowered[start - 1].isalnum():
+            continue
+        if end < length and lowered[end].isalnum():
+            continue
+        headings.append((start, end, index))
+    headings.sort(key=lambda item: (item[0], item[0] - item[1]))
+
+    sections = []
+    last_end = 0
+    for start, end, index in headings:
+        if start < last_end:
+            continue
+        position = end
+        while position < length and lowered[position] in ' \t':
+            position += 1
+        has_colon = position < length and lowered[position] in ':：'
+        heading_start, previous = _heading_prefix(lowered, start)
+        line_start = previous in '\r\n'
+        if lowered[start:end] in WEAK_SECTION_HEADINGS:
+            if not (has_colon and (line_start or previous in '.!?;')):
+                continue
+        elif not (has_colon or line_start):
+            continue
+        heading_start = max(heading_start, last_end)
+
+        if sections:
+            sections[-1]['end'] = heading_start
+        content_start = end
+        while content_start < length and lowered[content_start] in ':：-\t\r\n ':
+            content_start += 1
+        sections.append({
+            'section': _section_names[index],
+            'heading': text[heading_start:end],
+            'start': heading_start,
+            'content_start': content_start,
+            'end': length
+        })
+        last_end = end
+    return sections
+
+# Urutan level (indeks dipakai sebagai kode di array knowledge base)
+DANGER_LEVELS = ['low', 'medium', 'high', 'very_high']
+SAFETY_LEVELS = ['safe', 'very_safe']
+CATEGORY_DANGEROUS = 0
+CATEGORY_SAFE = 1
+
+# Naikkan jika struktur IngredientKnowledgeBase berubah (snapshot lama diabaikan)
+KB_SNAPSHOT_VERSION = 1
+
+def clean_label_text(text: str) -> str:
+    """Membersihkan teks untuk analisis"""
+    # Convert ke lowercase
+    text = text.lower()
+    
+    # Hapus karakter khusus kecuali yang diperlukan
+    text = re.sub(r'[^\w\s&,.-]', ' ', text)
+    
+    # Normalisasi spasi
+    text = ' '.join(text.split())
+    
+    return text
+
+def ingredient_key(name: str) -> str:
+    """ID stabil untuk bahan dari nama tampilan ('Sodium Lauryl Sulfate' -> 'sodium_lauryl_sulfate')"""
+    return '_'.join(name.lower().split())
+
+def analysis_ingredient_ids(analysis: Dict[str, List]) -> List[str]:
+    """ID bahan yang cocok (dangerous, safe, fuzzy) dalam satu hasil analyze_ingredients"""
+    ids = set()
+    for category in ('dangerous', 'safe', 'fuzzy'):
+        for entry in analysis.get(category, []):
+            ids.add(entry.get('id') or ingredient_key(entry['name']))
+    return sorted(ids)
+
+def _normalize_species(species: str) -> str:
+    """'cats' -> 'cat', 'all' tetap 'all'"""
+    species = species.strip().lower()
+    if species != 'all' and species.endswith('s'):
+        species = species[:-1]
+    return species
+
+class IngredientKnowledgeBase:
+    """
+    Knowledge base bahan hasil compile dari ingredients_database.json
+    - alias_index: alias (lowercase) -> indeks ID kanonik
+    - categories / levels: array numpy per ID
+    - animal_notes: spesies -> {indeks ID: catatan}
+    """
+    
+    def __init__(self):
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.aliases: List[List[str]] = []
+        self.alias_index: Dict[str, int] = {}
+        self.categories = np.zeros(0, dtype=np.int8)
+        self.levels = np.zeros(0, dtype=np.int8)
+        self.animal_notes: Dict[str, Dict[int, str]] = {}
+        self.animal_warnings: Dict[str, Dict[str, str]] = {}
+        self.source_signature = None
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def lookup(self, alias: str) -> Optional[int]:
+        """Cari indeks ID kanonik dari alias (exact, case-insensitive)"""
+        return self.alias_index.get(alias.strip().lower())
+    
+    def category(self, index: int) -> str:
+        return 'dangerous' if self.categories[index] == CATEGORY_DANGEROUS else 'safe'
+    
+    def level(self, index: int) -> str:
+        if self.categories[index] == CATEGORY_DANGEROUS:
+            return DANGER_LEVELS[self.levels[index]]
+        return SAFETY_LEVELS[self.levels[index]]
+    
+    def notes_for(self, index: int) -> Dict[str, str]:
+        """Catatan spesifik hewan untuk satu ID"""
+        return {species: notes[index] for species, notes in self.animal_notes.items() if index in notes}
+    
+    def save_snapshot(self, path: str):
+        """Simpan knowledge base sebagai snapshot biner (rename atomik)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((KB_SNAPSHOT_VERSION, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def load_snapshot(path: str) -> Optional['IngredientKnowledgeBase']:
+        """Load snapshot biner, None jika tidak ada atau versinya berbeda"""
+        try:
+            with open(path, 'rb') as f:
+                version, kb = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        if version != KB_SNAPSHOT_VERSION:
+            return None
+        return kb
 
 class IngredientAnalyzer:
     """Kelas untuk analisis keamanan bahan"""
     
-    def __init__(self):
-        self.dangerous_ingredients = self._load_dangerous_ingredients()
-        self.safe_ingredients = self._load_safe_ingredients()
+    def __init__(self, verify_matcher: bool = False, knowledge_base: Optional[IngredientKnowledgeBase] = None,
+                 fuzzy_max_edits: int = 0, ingredient_store=None):
+        # Sumber data: store SQLite (dibaca dari disk per lookup), knowledge base hasil compile,
+        # atau kamus bawaan
+        self.knowledge_base = knowledge_base
+        self.ingredient_store = ingredient_store
+        if ingredient_store is not None:
+            self.dangerous_ingredients, self.safe_ingredients = {}, {}
+        elif knowledge_base is not None:
+            self.dangerous_ingredients, self.safe_ingredients = self._load_from_knowledge_base(knowledge_base)
+        else:
+            self.dangerous_ingredients = self._load_dangerous_ingredients()
+            self.safe_ingredients = self._load_safe_ingredients()
+        
+        # Jalankan loop lama berdampingan untuk memastikan hasil identik
+        # (hanya untuk kamus bawaan; nama hasil knowledge base memakai ID kanonik)
+        self.verify_matcher = verify_matcher and knowledge_base is None and ingredient_store is None
+        self.matcher_mismatches = 0
+        
+        # Fuzzy lookup untuk bahan yang salah baca OCR (opt-in, mis. 2 untuk teks hasil OCR;
+        # 0 = nonaktif; tidak dipakai dengan store SQLite)
+        self.fuzzy_max_edits = fuzzy_max_edits if ingredient_store is None else 0
+        self._build_matcher()
+    
+    def _load_from_knowledge_base(self, kb: IngredientKnowledgeBase) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Bangun kamus alias -> alasan/manfaat dari knowledge base"""
+        dangerous = {}
+        safe = {}
+        for alias, index in kb.alias_index.items():
+            target = dangerous if kb.categories[index] == CATEGORY_DANGEROUS else safe
+            target[alias] = kb.descriptions[index]
+        return dangerous, safe
+    
+    def _build_matcher(self):
+        """
+        Compile kamus bahan menjadi satu automaton
+        Entry: (kategori, key pola, nama tampilan, deskripsi, field tambahan)
+        """
+        kb = self.knowledge_base
+        self._matcher_entries = []
+        for category, ingredients in (('dangerous', self.dangerous_ingredients), ('safe', self.safe_ingredients)):
+            for name, description in ingredients.items():
+                if kb is None:
+                    self._matcher_entries.append((category, name, name.title(), description, {}))
+                    continue
+                index = kb.alias_index[name]
+                level_field = 'danger_level' if category == 'dangerous' else 'safety_level'
+                self._matcher_entries.append(
+                    (category, name, kb.names[index].title(), description,
+                     {'id': kb.ids[index], level_field: kb.level(index)})
+                )
+        self.matcher = IngredientMatcher([entry[1] for entry in self._matcher_entries])
+        # Rangkaian kata yang dicoba fuzzy_lookup tidak perlu lebih panjang dari alias terpanjang
+        self.max_alias_words = max((len(entry[1].split()) for entry in self._matcher_entries), default=1)
+        self.fuzzy_index = None
+        if self.fuzzy_max_edits > 0:
+            self.fuzzy_index = FuzzyIngredientIndex([entry[1] for entry in self._matcher_entries],
+                                                    max_edits=self.fuzzy_max_edits)
     
     def _load_dangerous_ingredients(self) -> Dict[str, str]:
         """Load daftar bahan berbahaya"""
@@ -171,48 +1170,159 @@ class IngredientAnalyzer:
     
     def _clean_text(self, text: str) -> str:
         """Membersihkan teks untuk analisis"""
-        # Convert ke lowercase
-        text = text.lower()
-        
-        # Hapus karakter khusus kecuali yang diperlukan
-        text = re.sub(r'[^\w\s&,.-]', ' ', text)
-        
-        # Normalisasi spasi
-        text = ' '.join(text.split())
-        
-        return text
+        return clean_label_text(text)
     
     def _extract_ingredients_section(self, text: str) -> str:
-        """Ekstrak bagian ingredients dari teks"""
-        text_lower = text.lower()
+        """Ekstrak bagian ingredients dari teks mentah (judul dikenali dari baris dan ':')"""
+        sections = parse_label_sections(text)
         
-        # Pattern untuk mencari section ingredients
-        patterns = [
-            r'ingredients?[:\-\s]+(.*?)(?:directions?|instructions?|caution|warning|$)',
-            r'composition[:\-\s]+(.*?)(?:directions?|instructions?|caution|warning|$)',
-            r'contents?[:\-\s]+(.*?)(?:directions?|instructions?|caution|warning|$)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text_lower, re.DOTALL | re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
+        # Ambil bagian bahan dengan prioritas ingredients > composition > contents;
+        # semua bagian dengan jenis yang sama digabung ("Active ingredients: ...
+        # Inactive ingredients: ..."), bagian directions/warnings dilewati
+        for wanted in INGREDIENT_SECTIONS:
+            parts = [text[section['content_start']:section['end']].strip()
+                     for section in sections if section['section'] == wanted]
+            parts = [part for part in parts if part]
+            if parts:
+                return ', '.join(parts)
         
         # Jika tidak ditemukan section khusus, gunakan seluruh teks
         return text
     
+    def _split_ingredients(self, text: str) -> List[str]:
+        """Split teks menjadi daftar ingredient"""
+        ingredients_text = self._clean_text(self._extract_ingredients_section(text))
+        
+        # Split ingredients berdasarkan koma dan kata penghubung
+        ingredients_list = re.split(r'[,;]|\band\b|\bor\b', ingredients_text)
+        return [ing.strip() for ing in ingredients_list if ing.strip()]
+    
+    @METRICS.timed('analyze_ingredients')
     def analyze_ingredients(self, text: str) -> Dict[str, List]:
         """
         Analisis bahan-bahan dalam teks
         Returns: Dictionary dengan kategori dangerous, safe, unknown
+        (dan fuzzy jika fuzzy lookup aktif)
         """
-        cleaned_text = self._clean_text(text)
-        ingredients_text = self._extract_ingredients_section(cleaned_text)
+        ingredients_list = self._split_ingredients(text)
+        result = self._match_ingredients(ingredients_list)
         
-        # Split ingredients berdasarkan koma dan kata penghubung
-        ingredients_list = re.split(r'[,;]|\band\b|\bor\b', ingredients_text)
-        ingredients_list = [ing.strip() for ing in ingredients_list if ing.strip()]
+        if self.verify_matcher:
+            legacy_result = self._match_ingredients_legacy(ingredients_list)
+            if self._normalize_result(result) != self._normalize_result(legacy_result):
+                self.matcher_mismatches += 1
+                print(f"Peringatan: hasil matcher berbeda dengan loop lama untuk teks: {text[:80]!r}")
+                result = legacy_result
+        
+        if self.fuzzy_index is not None:
+            self._apply_fuzzy_matches(result)
+        
+        METRICS.inc('ingredients_analyzed', 'analyzer', len(ingredients_list))
+        return result
+    
+    def fuzzy_lookup(self, token: str) -> Optional[Dict]:
+        """
+        Cari bahan terdekat untuk token hasil OCR (mis. 'propy1paraben')
+        Mencoba setiap rangkaian kata di dalam token, paling banyak max_alias_words kata
+        """
+        if self.fuzzy_index is None:
+            return None
         
+        words = token.lower().split()
+        best = None
+        for size in range(min(len(words), self.max_alias_words), 0, -1):
+            for start in range(len(words) - size + 1):
+                match = self.fuzzy_index.lookup(' '.join(words[start:start + size]))
+                if match is not None and (best is None or match[2] > best[2]):
+                    best = match
+        
+        if best is None:
+            return None
+        
+        index, distance, score = best
+        category, key, name, description, extra = self._matcher_entries[index]
+        return {
+            'name': name,
+            'found_in': token,
+            'matched_alias': key,
+            'category': category,
+            'distance': distance,
+            'score': round(score, 3),
+            'reason' if category == 'dangerous' else 'benefit': description,
+            **extra
+        }
+    
+    def _apply_fuzzy_matches(self, result: Dict[str, List]):
+        """Pindahkan bahan unknown yang cocok secara fuzzy ke result['fuzzy']"""
+        fuzzy = []
+        unknown = []
+        for ingredient in result['unknown']:
+            match = self.fuzzy_lookup(ingredient)
+            if match is None:
+                unknown.append(ingredient)
+            else:
+                fuzzy.append(match)
+        result['unknown'] = unknown
+        result['fuzzy'] = fuzzy
+    
+    def _candidate_entries(self, ingredient: str) -> List[Tuple]:
+        """Entry yang cocok dengan ingredient, urut sesuai prioritas"""
+        if self.ingredient_store is not None:
+            return self.ingredient_store.match_ingredient(ingredient)
+        # Indeks kecil = prioritas lebih tinggi (dangerous lalu safe, sesuai urutan kamus)
+        entries = self._matcher_entries
+        return [entries[index] for index in self.matcher.find(ingredient.lower())]
+    
+    @staticmethod
+    def _entry_key(entry: Tuple) -> str:
+        """
+        Kunci duplikasi: ID kanonik jika ada (knowledge base / store, sehingga 'sls' dan
+        'sodium lauryl sulfate' dihitung sekali), alias untuk kamus bawaan (sama dengan loop lama)
+        """
+        return entry[4].get('id', entry[1])
+    
+    def _match_ingredients(self, ingredients_list: List[str]) -> Dict[str, List]:
+        """Klasifikasi ingredient dengan automaton (satu scan per ingredient)"""
+        dangerous = []
+        safe = []
+        unknown = []
+        found_ingredients = set()  # Untuk menghindari duplikasi
+        
+        for ingredient in ingredients_list:
+            if len(ingredient) < 2:  # Skip ingredient yang terlalu pendek
+                continue
+            
+            candidates = self._candidate_entries(ingredient)
+            matched = None
+            for entry in candidates:
+                if self._entry_key(entry) not in found_ingredients:
+                    matched = entry
+                    break
+            
+            if matched is None:
+                # Bahan yang sama sudah tercatat lewat alias lain (ID kanonik sama): bukan unknown
+                if any('id' in entry[4] for entry in candidates):
+                    continue
+                # Filter ingredient yang mungkin bukan nama bahan
+                if len(ingredient) > 3 and not re.match(r'^\d+%?$', ingredient):
+                    unknown.append(ingredient.title())
+                continue
+            
+            category, key, name, description, extra = matched
+            found_ingredients.add(self._entry_key(matched))
+            if category == 'dangerous':
+                dangerous.append({'name': name, 'found_in': ingredient, 'reason': description, **extra})
+            else:
+                safe.append({'name': name, 'found_in': ingredient, 'benefit': description, **extra})
+        
+        return {
+            'dangerous': dangerous,
+            'safe': safe,
+            'unknown': list(set(unknown))  # Remove duplicates
+        }
+    
+    def _match_ingredients_legacy(self, ingredients_list: List[str]) -> Dict[str, List]:
+        """Klasifikasi ingredient dengan loop lama (untuk verifikasi matcher)"""
         dangerous = []
         safe = []
         unknown = []
@@ -266,7 +1376,17 @@ class IngredientAnalyzer:
             'unknown': list(set(unknown))  # Remove duplicates
         }
     
-    def get_recommendation(self, analysis: Dict[str, List]) -> Dict[str, str]:
+    def _normalize_result(self, analysis: Dict[str, List]) -> Dict[str, List]:
+        """Bentuk hasil analisis yang bisa dibandingkan (urutan unknown tidak tetap)"""
+        return {
+            'dangerous': analysis['dangerous'],
+            'safe': analysis['safe'],
+            'unknown': sorted(analysis['unknown'])
+        }
+    
+    @staticmethod
+    @METRICS.timed('get_recommendation')
+    def get_recommendation(analysis: Dict[str, List]) -> Dict[str, str]:
         """
         Memberikan rekomendasi berdasarkan hasil analisis
         """
@@ -306,13 +1426,174 @@ def save_analysis_results(results: dict, filename: str = "analysis_results.json"
         print(f"Error menyimpan file: {e}")
 
 def load_custom_ingredients_db(filename: str = "ingredients_db.json") -> dict:
-    """Load database bahan kustom dari file JSON"""
+    """
+    Load database bahan kustom dari file JSON
+    (termasuk update di change log DatabaseManager yang belum dipadatkan)
+    """
+    from advanced_features import load_json_database
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_json_database(filename)
     except FileNotFoundError:
         print(f"File {filename} tidak ditemukan, menggunakan database default")
         return {}
     except Exception as e:
         print(f"Error loading database: {e}")
-        return {}
\ No newline at end of file
+        return {}
+
+def validate_ingredients_database(data: dict) -> List[str]:
+    """
+    Validasi struktur ingredients_database.json
+    Returns: daftar pesan error (kosong jika valid)
+    """
+    errors = []
+    if not isinstance(data, dict):
+        return ["Root database harus berupa object"]
+    
+    sections = (
+        ('dangerous_ingredients', 'danger_level', DANGER_LEVELS, 'reason'),
+        ('safe_ingredients', 'safety_level', SAFETY_LEVELS, 'benefits'),
+    )
+    for section, level_field, allowed_levels, text_field in sections:
+        entries = data.get(section)
+        if not isinstance(entries, dict):
+            errors.append(f"'{section}' harus berupa object")
+            continue
+        for ingredient_id, entry in entries.items():
+            where = f"{section}.{ingredient_id}"
+            if not isinstance(entry, dict):
+                errors.append(f"{where}: entry harus berupa object")
+                continue
+            aliases = entry.get('aliases', [])
+            if not isinstance(aliases, list) or not all(isinstance(a, str) and a.strip() for a in aliases):
+                errors.append(f"{where}: 'aliases' harus berupa list string")
+            if entry.get(level_field) not in allowed_levels:
+                errors.append(f"{where}: '{level_field}' harus salah satu dari {allowed_levels}")
+            if not isinstance(entry.get(text_field), str):
+                errors.append(f"{where}: '{text_field}' wajib diisi")
+            animal_specific = entry.get('animal_specific', {})
+            if not isinstance(animal_specific, dict) or not all(isinstance(v, str) for v in animal_specific.values()):
+                errors.append(f"{where}: 'animal_specific' harus berupa object spesies -> catatan")
+    
+    # Alias yang sama tidak boleh menunjuk ke dua ID berbeda
+    seen = {}
+    for section in ('dangerous_ingredients', 'safe_ingredients'):
+        entries = data.get(section)
+        if not isinstance(entries, dict):
+            continue
+        for ingredient_id, entry in entries.items():
+            if not isinstance(entry, dict) or not isinstance(entry.get('aliases', []), list):
+                continue
+            names = [ingredient_id.replace('_', ' ')] + [a for a in entry.get('aliases', []) if isinstance(a, str)]
+            for alias in names:
+                alias = alias.strip().lower()
+                if alias in seen and seen[alias] != ingredient_id:
+                    errors.append(f"Alias '{alias}' dipakai oleh '{seen[alias]}' dan '{ingredient_id}'")
+                seen.setdefault(alias, ingredient_id)
+    
+    return errors
+
+def compile_knowledge_base(data: dict) -> IngredientKnowledgeBase:
+    """Compile data database (sudah divalidasi) menjadi IngredientKnowledgeBase"""
+    kb = IngredientKnowledgeBase()
+    categories = []
+    levels = []
+    
+    sections = (
+        ('dangerous_ingredients', CATEGORY_DANGEROUS, 'danger_level', DANGER_LEVELS, 'reason'),
+        ('safe_ingredients', CATEGORY_SAFE, 'safety_level', SAFETY_LEVELS, 'benefits'),
+    )
+    for section, category, level_field, allowed_levels, text_field in sections:
+        for ingredient_id, entry in data.get(section, {}).items():
+            index = len(kb.ids)
+            name = ingredient_id.replace('_', ' ').lower()
+            aliases = [name] + [alias.strip().lower() for alias in entry.get('aliases', [])]
+            
+            kb.ids.append(ingredient_id)
+            kb.names.append(name)
+            kb.descriptions.append(entry[text_field])
+            kb.aliases.append(aliases)
+            categories.append(category)
+            levels.append(allowed_levels.index(entry[level_field]))
+            
+            for alias in aliases:
+                kb.alias_index.setdefault(alias, index)
+            for species, note in entry.get('animal_specific', {}).items():
+                kb.animal_notes.setdefault(_normalize_species(species), {})[index] = note
+    
+    kb.categories = np.array(categories, dtype=np.int8)
+    kb.levels = np.array(levels, dtype=np.int8)
+    kb.animal_warnings = {
+        _normalize_species(species): warnings
+        for species, warnings in data.get('animal_specific_warnings', {}).items()
+    }
+    return kb
+
+def diff_knowledge_bases(old: IngredientKnowledgeBase,
+                         new: IngredientKnowledgeBase) -> Tuple[List[str], List[str]]:
+    """
+    Bandingkan dua versi knowledge base
+    Returns: (ID bahan yang ditambah/dihapus/berubah, semua alias lama+baru dari ID tersebut)
+    """
+    def entries(kb: IngredientKnowledgeBase) -> Dict[str, tuple]:
+        notes = {}
+        for species, by_index in kb.animal_notes.items():
+            for index, note in by_index.items():
+                notes.setdefault(index, []).append((species, note))
+        return {
+            ingredient_id: (kb.category(index), kb.level(index), kb.descriptions[index],
+                            tuple(kb.aliases[index]), tuple(sorted(notes.get(index, []))))
+            for index, ingredient_id in enumerate(kb.ids)
+        }
+    
+    old_entries = entries(old)
+    new_entries = entries(new)
+    changed = sorted(ingredient_id for ingredient_id in set(old_entries) | set(new_entries)
+                     if old_entries.get(ingredient_id) != new_entries.get(ingredient_id))
+    aliases = set()
+    for ingredient_id in changed:
+        for version in (old_entries, new_entries):
+            if ingredient_id in version:
+                aliases.update(version[ingredient_id][3])
+    return changed, sorted(aliases)
+
+def load_knowledge_base(filename: str = "ingredients_database.json",
+                        snapshot_path: Optional[str] = None) -> Optional[IngredientKnowledgeBase]:
+    """
+    Load knowledge base, memakai snapshot biner jika masih sesuai dengan file JSON
+    Returns: IngredientKnowledgeBase, atau None jika database tidak valid
+    """
+    if snapshot_path is None:
+        snapshot_path = os.path.splitext(filename)[0] + ".kb"
+    
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        print(f"File {filename} tidak ditemukan")
+        return None
+    signature = (stat.st_size, stat.st_mtime_ns)
+    
+    kb = IngredientKnowledgeBase.load_snapshot(snapshot_path)
+    if kb is not None and kb.source_signature == signature:
+        return kb
+    
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error loading database: {e}")
+        return None
+    
+    errors = validate_ingredients_database(data)
+    if errors:
+        print(f"Database {filename} tidak valid:")
+        for error in errors:
+            print(f"  - {error}")
+        return None
+    
+    kb = compile_knowledge_base(data)
+    kb.source_signature = signature
+    try:
+        kb.save_snapshot(snapshot_path)
+    except OSError as e:
+        print(f"Error menyimpan snapshot knowledge base: {e}")
+    return kb
@@ -0,0 +1,268 @@
+"""
+Regression test untuk fitur lanjutan (advanced_features)
+
+Jalankan: python -m pytest -q
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import unquote
+
+import pytest
+
+from advanced_features import AnimalSpecificAnalyzer, BatchProcessor, DatabaseManager, SQLiteIngredientStore
+from pet_product_utils import IngredientAnalyzer, compile_knowledge_base, load_custom_ingredients_db
+
+KNOWLEDGE_BASE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingredients_database.json")
+
+STORE_LABELS = [
+    "butylparaben, water",
+    "water, SLS, sodium lauryl sulfate, methylparaben, propylparaben",
+    "Ingredients: aloe vera gel, coconut oil, artificial colors, fd&c red 40",
+    "Komposisi: air, propylene glycol, ekstrak chamomile",
+]
+
+@pytest.fixture(scope='module')
+def database():
+    with open(KNOWLEDGE_BASE_JSON, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _result_ids(result):
+    return {category: [entry['id'] for entry in result[category]] for category in ('dangerous', 'safe')}
+
+@pytest.mark.parametrize('label', STORE_LABELS)
+def test_store_matches_knowledge_base(tmp_path, database, label):
+    store = SQLiteIngredientStore(str(tmp_path / "ingredients.sqlite"))
+    store.import_data(database)
+    in_memory = IngredientAnalyzer(knowledge_base=compile_knowledge_base(database))
+    from_store = IngredientAnalyzer(ingredient_store=store)
+    assert _result_ids(from_store.analyze_ingredients(label)) == _result_ids(in_memory.analyze_ingredients(label))
+
+@pytest.mark.parametrize('label', STORE_LABELS)
+def test_store_matches_builtin_dictionaries(tmp_path, label):
+    builtin = IngredientAnalyzer()
+    store = SQLiteIngredientStore(str(tmp_path / "ingredients.sqlite"))
+    store.import_data({'dangerous': builtin.dangerous_ingredients, 'safe': builtin.safe_ingredients})
+    from_store = IngredientAnalyzer(ingredient_store=store)
+    expected = builtin.analyze_ingredients(label)
+    result = from_store.analyze_ingredients(label)
+    for category in ('dangerous', 'safe'):
+        assert [entry['name'] for entry in result[category]] == [entry['name'] for entry in expected[category]]
+
+def test_store_returns_one_entry_per_ingredient(tmp_path, database):
+    store = SQLiteIngredientStore(str(tmp_path / "ingredients.sqlite"))
+    store.import_data(database)
+    entries = store.match_ingredient("sodium lauryl sulfate (sls)")
+    assert [entry[4]['id'] for entry in entries] == ['sodium_lauryl_sulfate']
+    assert [entry[4]['id'] for entry in store.match_ingredient("butylparaben")] == ['paraben']
+
+@pytest.mark.parametrize('with_knowledge_base', [False, True])
+def test_specific_animal_matches_all_animals(database, with_knowledge_base):
+    knowledge_base = compile_knowledge_base(database) if with_knowledge_base else None
+    animal_analyzer = AnimalSpecificAnalyzer(knowledge_base=knowledge_base)
+    ingredients = ['water', 'parabens', 'propylene glycol', 'aloe vera', 'xylitol']
+    all_animals = animal_analyzer.analyze_for_all_animals(ingredients)
+    for animal_type in animal_analyzer.species:
+        assert animal_analyzer.analyze_for_specific_animal(ingredients, animal_type) == all_animals[animal_type]
+
+def test_animal_analyzer_does_not_load_knowledge_base_implicitly():
+    assert AnimalSpecificAnalyzer().knowledge_base is None
+
+def test_database_versions_survive_compaction_and_torn_tail(tmp_path):
+    manager = DatabaseManager(compact_every=7, db_file=str(tmp_path / "ingredients_db.json"))
+    for i in range(20):
+        assert manager.update_database_from_research({'dangerous_ingredients': {f'bahan_{i}': 'alasan'}}) == i + 1
+    # Baris terakhir yang tidak selesai ditulis (crash) dibuang sebelum append berikutnya
+    with open(manager.log_file, 'a', encoding='utf-8') as f:
+        f.write('{"version": 21, "del')
+    assert manager.update_database_from_research({'safe_ingredients': {'aloe': 'manfaat'}}) == 21
+    version, database = manager.load_database()
+    assert version == 21
+    assert len(database['dangerous_ingredients']) == 20
+    assert database['safe_ingredients'] == {'aloe': 'manfaat'}
+
+def test_custom_db_readers_replay_change_log(tmp_path):
+    db_file = str(tmp_path / "ingredients_db.json")
+    manager = DatabaseManager(compact_every=7, db_file=db_file)
+    for i in range(10):
+        manager.update_database_from_research({'dangerous_ingredients': {f'bahan {i}': 'alasan'}})
+    expected = manager.load_database()[1]
+    # Snapshot hanya berisi 7 update pertama; 3 sisanya masih di log
+    assert len(expected['dangerous_ingredients']) == 10
+    assert load_custom_ingredients_db(db_file) == expected
+    store = SQLiteIngredientStore(str(tmp_path / "ingredients.sqlite"))
+    assert store.import_json(db_file) == 10
+    assert store.lookup_alias('bahan 9')['category'] == 'dangerous'
+
+def test_stream_batch_results_propagates_producer_errors(tmp_path):
+    processor = BatchProcessor(analyzer=None, image_processor=None)
+    output_file = str(tmp_path / "batch_results.jsonl")
+    
+    def failing_results():
+        yield {'image_path': 'a.jpg'}
+        raise RuntimeError("worker mati")
+    
+    with pytest.raises(RuntimeError, match="worker mati"):
+        processor.stream_batch_results(failing_results(), output_file)
+    # Hasil sebelum error tetap tertulis
+    assert list(processor.load_batch_results(output_file)) == [{'image_path': 'a.jpg'}]
+
+def test_stream_batch_results_reports_write_errors(tmp_path):
+    processor = BatchProcessor(analyzer=None, image_processor=None)
+    assert processor.stream_batch_results([{'image_path': 'a.jpg'}], str(tmp_path / "tidak_ada" / "x.jsonl")) == 0
+
+class _StubPubChemHandler(BaseHTTPRequestHandler):
+    """Stub PubChem: nama menentukan status respon, setiap request dicatat"""
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        stats = self.server.stats
+        name = unquote(self.path.split('/')[2])
+        with stats['lock']:
+            stats['requests'].append((time.monotonic(), name))
+            stats['in_flight'] += 1
+            stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        time.sleep(self.server.delay)
+        with stats['lock']:
+            stats['in_flight'] -= 1
+        status = {'missing': 404, 'broken': 500, 'limited': 429}.get(name, 200)
+        body = json.dumps({'name': name}).encode('utf-8') if status == 200 else b'{}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def stub_pubchem():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubPubChemHandler)
+    server.daemon_threads = True
+    server.delay = 0.05
+    server.stats = {'lock': threading.Lock(), 'requests': [], 'in_flight': 0, 'max_in_flight': 0}
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _stub_manager(server, **options) -> DatabaseManager:
+    manager = DatabaseManager(**options)
+    manager.api_endpoints['pubchem'] = f"http://127.0.0.1:{server.server_address[1]}/name/{{}}/JSON"
+    return manager
+
+def _requested_names(server) -> List[str]:
+    return sorted(name.lower() for _, name in server.stats['requests'])
+
+def test_online_lookup_deduplicates_names(stub_pubchem):
+    manager = _stub_manager(stub_pubchem, requests_per_second=1000)
+    names = ['Aloe Vera', 'aloe vera', '  ALOE   vera ', 'sls', 'SLS']
+    results = manager.search_ingredients_online(names)
+    assert _requested_names(stub_pubchem) == ['aloe vera', 'sls']
+    assert set(results) == set(names)
+    assert all(result['found'] for result in results.values())
+
+def test_online_lookup_caches_positive_and_negative_results_only(stub_pubchem):
+    manager = _stub_manager(stub_pubchem, requests_per_second=1000)
+    names = ['aloe', 'missing', 'broken', 'limited']
+    first = manager.search_ingredients_online(names)
+    assert first['aloe']['found'] and not first['missing']['found']
+    assert not first['broken']['found'] and not first['limited']['found']
+    
+    stub_pubchem.stats['requests'].clear()
+    second = manager.search_ingredients_online(names)
+    # 404 (negatif) dan 200 dari cache; 5xx dan 429 dicoba lagi
+    assert _requested_names(stub_pubchem) == ['broken', 'limited']
+    assert second['aloe'] == first['aloe']
+    assert second['missing'] == first['missing']
+
+def test_online_lookup_respects_concurrency_limit(stub_pubchem):
+    manager = _stub_manager(stub_pubchem, max_concurrency=2, requests_per_second=1000)
+    manager.search_ingredients_online([f'bahan {i}' for i in range(8)])
+    assert len(stub_pubchem.stats['requests']) == 8
+    assert stub_pubchem.stats['max_in_flight'] == 2
+
+def test_online_lookup_respects_rate_limit(stub_pubchem):
+    stub_pubchem.delay = 0.0
+    manager = _stub_manager(stub_pubchem, max_concurrency=5, requests_per_second=20)
+    started = time.monotonic()
+    manager.search_ingredients_online([f'bahan {i}' for i in range(6)])
+    arrivals = sorted(arrival for arrival, _ in stub_pubchem.stats['requests'])
+    assert len(arrivals) == 6
+    # Request ke-k paling cepat dikirim k interval (50ms) setelah mulai; jitter hanya bisa memperlambat
+    for k, arrival in enumerate(arrivals):
+        assert arrival - started >= k * 0.05 - 0.005
+
+def _changed_database(database):
+    """Gliserin dipindah ke dangerous, xylitol (baru) ditambahkan"""
+    changed = json.loads(json.dumps(database))
+    glycerin = changed['safe_ingredients'].pop('glycerin')
+    changed['dangerous_ingredients']['glycerin'] = {
+        'aliases': glycerin.get('aliases', []),
+        'danger_level': 'low',
+        'reason': 'Contoh reklasifikasi',
+        'animal_specific': {'cats': 'Hindari untuk kucing'}
+    }
+    changed['dangerous_ingredients']['xylitol'] = {
+        'aliases': ['birch sugar'],
+        'danger_level': 'very_high',
+        'reason': 'Beracun untuk anjing',
+        'animal_specific': {'dogs': 'Sangat beracun'}
+    }
+    return changed
+
+def _history_corpus(database, count=300, seed=7):
+    import random
+    
+    rng = random.Random(seed)
+    names = []
+    for section in ('dangerous_ingredients', 'safe_ingredients'):
+        for ingredient_id, entry in database[section].items():
+            names.append(ingredient_id.replace('_', ' '))
+            names.extend(entry.get('aliases', []))
+    names += ['xylitol', 'birch sugar', 'water', 'rice flour', 'natural flavor']
+    return [f"Ingredients: {', '.join(rng.sample(names, rng.randint(2, 6)))}" for _ in range(count)]
+
+def _stored_products(store):
+    rows = store._connect().execute("SELECT image_path, analysis, status FROM products ORDER BY image_path")
+    return [(image_path, json.loads(analysis), status) for image_path, analysis, status in rows]
+
+def test_history_incremental_reanalysis_matches_full(tmp_path, database):
+    from advanced_features import AnalysisHistoryStore
+    
+    new_database = _changed_database(database)
+    old_analyzer = IngredientAnalyzer(knowledge_base=compile_knowledge_base(database))
+    new_analyzer = IngredientAnalyzer(knowledge_base=compile_knowledge_base(new_database))
+    results = []
+    for i, text in enumerate(_history_corpus(database)):
+        results.append({'image_path': f"produk_{i:04d}.jpg", 'extracted_text': text,
+                        'analysis': old_analyzer.analyze_ingredients(text)})
+    
+    incremental = AnalysisHistoryStore(str(tmp_path / "incremental.sqlite"))
+    full = AnalysisHistoryStore(str(tmp_path / "full.sqlite"))
+    assert incremental.add_results(results) == full.add_results(results) == len(results)
+    
+    # Inverted index dan pencarian alias FTS
+    expected_glycerin = {i + 1 for i, result in enumerate(results)
+                         if any(entry['id'] == 'glycerin' for entry in result['analysis']['safe'])}
+    assert incremental.products_with_ingredients(['glycerin']) == expected_glycerin
+    expected_xylitol = {i + 1 for i, result in enumerate(results)
+                        if 'xylitol' in result['extracted_text'] or 'birch sugar' in result['extracted_text']}
+    assert expected_xylitol
+    assert incremental.products_with_text(['xylitol', 'birch sugar']) == expected_xylitol
+    
+    summary = incremental.reanalyze_for_database_change(database, new_database)
+    assert summary['changed_ingredients'] == ['glycerin', 'xylitol']
+    assert 0 < summary['reanalyzed'] < len(results)
+    full_summary = full.reanalyze(new_analyzer, full=True)
+    assert full_summary['reanalyzed'] == len(results)
+    
+    assert _stored_products(incremental) == _stored_products(full)
+    assert summary['status_changes']
+    assert sorted(change['image_path'] for change in summary['status_changes']) == \
+        sorted(change['image_path'] for change in full_summary['status_changes'])
@@ -0,0 +1,115 @@
+"""
+Regression test untuk HTTP service (analysis_service)
+
+OCR diganti stub lambat yang bisa ditahan, agar backpressure (429), /ready (503)
+dan pelepasan slot setelah timeout (504) bisa diuji tanpa Tesseract.
+
+Jalankan: python -m pytest -q
+"""
+
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import analysis_service
+from analysis_service import AnalysisRequestHandler, AnalysisService
+
+@pytest.fixture
+def ocr_gate(monkeypatch):
+    """Stub OCR: menunggu gate dibuka, lalu mengembalikan teks tetap"""
+    gate = threading.Event()
+
+    def slow_ocr(image_bytes):
+        gate.wait(10)
+        return "Ingredients: water, sodium lauryl sulfate", None
+
+    monkeypatch.setattr(analysis_service, '_ocr_in_worker', slow_ocr)
+    yield gate
+    gate.set()
+
+def _start_server(**service_options):
+    service = AnalysisService(**service_options)
+    # Thread pool menggantikan process pool agar stub OCR dipakai
+    service._executor = ThreadPoolExecutor(max_workers=service.workers)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AnalysisRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def factory(**service_options):
+        server = _start_server(**service_options)
+        servers.append(server)
+        return server
+
+    yield factory
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+        server.service.shutdown()
+
+def _request(server, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+    finally:
+        connection.close()
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("kondisi tidak tercapai")
+        time.sleep(0.01)
+
+@pytest.mark.parametrize('body', [b'["x"]', b'"teks"', b'{"text": 5}', b'bukan json'])
+def test_text_endpoint_rejects_invalid_payload(make_server, body):
+    server = make_server()
+    status, payload = _request(server, 'POST', '/analyze/text', body)
+    assert status == 400
+    assert 'error' in payload
+
+def test_text_endpoint_analyzes(make_server):
+    server = make_server()
+    status, payload = _request(server, 'POST', '/analyze/text', json.dumps({'text': 'water, sls'}).encode('utf-8'))
+    assert status == 200
+    assert payload['recommendation']['status'] == 'dangerous'
+
+def test_backpressure_rejects_when_slots_are_full(make_server, ocr_gate):
+    server = make_server(workers=1, queue_limit=1, ocr_timeout=10)
+    service = server.service
+    with ThreadPoolExecutor(max_workers=2) as clients:
+        busy = [clients.submit(_request, server, 'POST', '/analyze/image', b'gambar') for _ in range(2)]
+        _wait_for(lambda: service.in_flight == 2)
+
+        assert _request(server, 'POST', '/analyze/image', b'gambar')[0] == 429
+        assert _request(server, 'GET', '/ready') == (503, {'ready': False, 'in_flight': 2})
+
+        ocr_gate.set()
+        assert [future.result()[0] for future in busy] == [200, 200]
+    assert _request(server, 'GET', '/ready') == (200, {'ready': True, 'in_flight': 0})
+
+def test_timeout_keeps_slot_until_job_finishes(make_server, ocr_gate):
+    server = make_server(workers=1, queue_limit=0, ocr_timeout=0.1)
+    service = server.service
+
+    assert _request(server, 'POST', '/analyze/image', b'gambar')[0] == 504
+    # Job masih berjalan di worker: slot tetap terpakai
+    assert service.in_flight == 1
+    assert _request(server, 'GET', '/ready')[0] == 503
+    assert _request(server, 'POST', '/analyze/image', b'gambar')[0] == 429
+
+    ocr_gate.set()
+    _wait_for(lambda: service.in_flight == 0)
+    assert _request(server, 'GET', '/ready')[0] == 200
@@ -0,0 +1,54 @@
+"""
+Regression test untuk analisis bulk (bulk_analyzer)
+
+Jalankan: python -m pytest -q
+"""
+
+import csv
+import json
+
+import pytest
+
+from bulk_analyzer import read_chunks, run_bulk_analysis
+
+def _write_csv(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def test_missing_csv_column_raises(tmp_path):
+    path = tmp_path / "katalog.csv"
+    _write_csv(path, ['sku', 'ingredient_text'], [['a1', 'water, sls']])
+    with pytest.raises(KeyError, match='ingredients'):
+        list(read_chunks(str(path), 'ingredients'))
+    with pytest.raises(KeyError, match='kode'):
+        list(read_chunks(str(path), 'ingredient_text', id_column='kode'))
+
+def test_missing_jsonl_column_raises(tmp_path):
+    path = tmp_path / "katalog.jsonl"
+    path.write_text(json.dumps({'ingredient_text': 'water'}) + "\n", encoding='utf-8')
+    with pytest.raises(KeyError):
+        list(read_chunks(str(path), 'ingredients'))
+
+def test_jsonl_values_are_coerced(tmp_path):
+    path = tmp_path / "katalog.jsonl"
+    records = [{'ingredients': ['sls', 'aloe vera']}, {'ingredients': None}, {'ingredients': 'paraben'}]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding='utf-8')
+    rows = [row for chunk in read_chunks(str(path), 'ingredients') for row in chunk]
+    assert rows == [('0', 'sls, aloe vera'), ('1', ''), ('2', 'paraben')]
+
+def test_unsupported_jsonl_value_raises(tmp_path):
+    path = tmp_path / "katalog.jsonl"
+    path.write_text(json.dumps({'ingredients': {'nested': 'sls'}}) + "\n", encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(read_chunks(str(path), 'ingredients'))
+
+def test_run_bulk_analysis_writes_results(tmp_path):
+    path = tmp_path / "katalog.csv"
+    _write_csv(path, ['sku', 'ingredients'], [['a1', 'water, sodium lauryl sulfate'], ['a2', 'aloe vera']])
+    output = tmp_path / "hasil.csv"
+    assert run_bulk_analysis(str(path), str(output), id_column='sku', workers=1) == 2
+    with open(output, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['id'], row['status']) for row in rows] == [('a1', 'dangerous'), ('a2', 'safe')]
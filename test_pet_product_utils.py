@@ -0,0 +1,132 @@
+"""
+Regression test untuk analisis teks label (pet_product_utils)
+
+Jalankan: python -m pytest -q
+"""
+
+import json
+import os
+import re
+
+import pytest
+
+from pet_product_utils import IngredientAnalyzer, compile_knowledge_base, parse_label_sections
+
+KNOWLEDGE_BASE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingredients_database.json")
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return IngredientAnalyzer()
+
+@pytest.fixture(scope='module')
+def knowledge_base():
+    # Compile langsung dari JSON (tanpa menulis snapshot .kb)
+    with open(KNOWLEDGE_BASE_JSON, 'r', encoding='utf-8') as f:
+        return compile_knowledge_base(json.load(f))
+
+def _names(entries):
+    return sorted(entry['name'].lower() for entry in entries)
+
+def _legacy_extract(text: str) -> str:
+    """Ekstraksi section versi lama (regex pada teks yang sudah dibersihkan)"""
+    patterns = [
+        r'ingredients?[:\-\s]+(.*?)(?:directions?|instructions?|caution|warning|$)',
+        r'composition[:\-\s]+(.*?)(?:directions?|instructions?|caution|warning|$)',
+        r'contents?[:\-\s]+(.*?)(?:directions?|instructions?|caution|warning|$)',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        if match:
+            return match.group(1).strip()
+    return text
+
+# Label yang sudah benar ditangani versi lama: hasil bahan berbahaya/aman harus sama
+LEGACY_LABELS = [
+    "Ingredients: Water, Aloe Vera, Sodium Lauryl Sulfate, Fragrance. Directions: apply to wet coat",
+    "INGREDIENTS: water, oatmeal, coconut oil, methylparaben\nWARNING: avoid contact with eyes",
+    "Composition: chicken meal, rice, BHA, vitamin e",
+    "Contents: glycerin, propylene glycol, chamomile extract",
+    "water, aloe vera, propylene glycol, artificial color",
+    "Active ingredients: permethrin. Inactive ingredients: water, propylene glycol, methylparaben",
+]
+
+@pytest.mark.parametrize('label', LEGACY_LABELS)
+def test_matches_legacy_extraction(analyzer, label):
+    ingredients_text = _legacy_extract(analyzer._clean_text(label))
+    legacy_list = [ing.strip() for ing in re.split(r'[,;]|\band\b|\bor\b', ingredients_text) if ing.strip()]
+    legacy = analyzer._match_ingredients(legacy_list)
+    result = analyzer.analyze_ingredients(label)
+    assert _names(result['dangerous']) == _names(legacy['dangerous'])
+    assert _names(result['safe']) == _names(legacy['safe'])
+
+def test_all_sections_of_same_type_are_combined(analyzer):
+    result = analyzer.analyze_ingredients(
+        "Active ingredients: permethrin. Inactive ingredients: water, propylene glycol, methylparaben")
+    assert _names(result['dangerous']) == ['paraben', 'propylene glycol']
+
+def test_qualifier_is_part_of_heading():
+    sections = parse_label_sections("Active ingredients: permethrin. Inactive ingredients: water")
+    assert [section['heading'] for section in sections] == ['Active ingredients', 'Inactive ingredients']
+    first = sections[0]
+    assert "Active ingredients: permethrin. Inactive ingredients: water"[
+        first['content_start']:first['end']].strip() == 'permethrin.'
+
+def test_bahan_inside_list_does_not_split_section(analyzer):
+    result = analyzer.analyze_ingredients("Komposisi: air, sodium lauryl sulfate, ekstrak bahan alami, paraben")
+    assert _names(result['dangerous']) == ['paraben', 'sodium lauryl sulfate']
+
+def test_content_inside_list_does_not_split_section(analyzer):
+    result = analyzer.analyze_ingredients("Ingredients: water, content of aloe vera 5%, mineral oil")
+    assert _names(result['dangerous']) == ['mineral oil']
+    assert _names(result['safe']) == ['aloe vera']
+
+def test_kandungan_mid_sentence_is_not_heading():
+    sections = parse_label_sections("Ingredients: water, kandungan: 5% aloe vera")
+    assert [section['section'] for section in sections] == ['ingredients']
+
+def test_heading_words_without_colon_mid_line_are_ignored():
+    sections = parse_label_sections("Ingredients: water, caution grade glycerin, instruction oil")
+    assert [section['section'] for section in sections] == ['ingredients']
+
+def test_heading_at_line_start_without_colon(analyzer):
+    label = "INGREDIENTS\nWater, Aloe Vera, Sodium Lauryl Sulfate\nDIRECTIONS\nApply to wet coat. Caution: paraben free"
+    sections = parse_label_sections(label)
+    assert [section['section'] for section in sections] == ['ingredients', 'directions', 'warnings']
+    result = analyzer.analyze_ingredients(label)
+    assert _names(result['dangerous']) == ['sodium lauryl sulfate']
+
+def test_indonesian_sections():
+    label = "Bahan aktif: fipronil 10%\nCara pakai: teteskan pada tengkuk\nPeringatan: jauhkan dari anak"
+    sections = parse_label_sections(label)
+    assert [section['section'] for section in sections] == ['ingredients', 'directions', 'warnings']
+    assert sections[0]['heading'] == 'Bahan aktif'
+
+def test_weak_heading_at_line_start_with_colon():
+    sections = parse_label_sections("Shampoo kucing\nKandungan: air, aloe vera")
+    assert [section['section'] for section in sections] == ['ingredients']
+
+def test_no_heading_uses_whole_text(analyzer):
+    assert analyzer._split_ingredients("water, aloe vera") == ['water', 'aloe vera']
+
+def test_fuzzy_lookup_is_opt_in(analyzer):
+    assert analyzer.fuzzy_index is None
+    assert 'fuzzy' not in analyzer.analyze_ingredients("Ingredients: water, glycer1n")
+
+def test_fuzzy_lookup_window_is_bounded_by_alias_words():
+    fuzzy_analyzer = IngredientAnalyzer(fuzzy_max_edits=2)
+    assert fuzzy_analyzer.max_alias_words == max(
+        len(name.split()) for name in {**fuzzy_analyzer.dangerous_ingredients, **fuzzy_analyzer.safe_ingredients})
+    result = fuzzy_analyzer.analyze_ingredients("Ingredients: water, contains sodium laury1 sulfate, glycer1n extract")
+    assert _names(result['fuzzy']) == ['glycerin', 'sodium lauryl sulfate']
+
+def test_knowledge_base_matches_are_deduplicated_by_id(knowledge_base):
+    kb_analyzer = IngredientAnalyzer(knowledge_base=knowledge_base)
+    result = kb_analyzer.analyze_ingredients("water, SLS, sodium lauryl sulfate, methylparaben, propylparaben")
+    assert sorted(entry['id'] for entry in result['dangerous']) == ['paraben', 'sodium_lauryl_sulfate']
+    assert result['unknown'] == ['Water']
+    assert kb_analyzer.get_recommendation(result)['message'].count('2 bahan berbahaya') == 1
+
+def test_builtin_dictionary_matches_legacy_loop():
+    verifying = IngredientAnalyzer(verify_matcher=True)
+    verifying.analyze_ingredients("water, SLS, sodium lauryl sulfate, methylparaben, propylparaben, paraben")
+    assert verifying.matcher_mismatches == 0
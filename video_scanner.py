@@ -0,0 +1,316 @@
+"""
+Mode scan video / kamera live untuk Pet Product Safety Analyzer
+
+Frame dibaca dari file video atau device kamera. Frame yang masih bergerak,
+buram, atau hampir sama dengan frame yang sudah di-OCR dilewati (gate murah
+pada thumbnail). Frame yang stabil dan tajam di-OCR di background worker,
+teks dari beberapa frame untuk label yang sama digabung, lalu dianalisis
+sekali per label.
+
+Contoh:
+    python video_scanner.py rekaman_rak.mp4 --output hasil_scan.jsonl
+    python video_scanner.py --device 0
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from pet_product_lazy import lazy_import
+from pet_product_metrics import METRICS
+from pet_product_utils import ImageProcessor, IngredientAnalyzer
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+class FrameGate:
+    """
+    Gate murah untuk memilih frame yang layak di-OCR
+    - motion: selisih rata-rata thumbnail dengan frame sebelumnya > diff_threshold
+    - blur: variance Laplacian < sharpness_threshold
+    - duplicate: hampir sama dengan frame terakhir yang di-commit (kecuali jauh lebih tajam)
+    Frame 'accept' baru menjadi pembanding duplicate setelah commit() (yaitu benar-benar di-OCR)
+    """
+
+    def __init__(self, diff_threshold: float = 6.0, sharpness_threshold: float = 60.0,
+                 stable_frames: int = 3, duplicate_threshold: float = 3.0, thumb_width: int = 160,
+                 sharpness_width: int = 640):
+        self.diff_threshold = diff_threshold
+        self.sharpness_threshold = sharpness_threshold
+        self.stable_frames = stable_frames
+        self.duplicate_threshold = duplicate_threshold
+        self.thumb_width = thumb_width
+        self.sharpness_width = sharpness_width
+        self.reset()
+
+    def reset(self):
+        self._previous_thumb = None
+        self._accepted_thumb = None
+        self._accepted_sharpness = 0.0
+        self._candidate = None
+        self._stable_count = 0
+
+    def _resize_width(self, gray: np.ndarray, width: int) -> np.ndarray:
+        height, original_width = gray.shape
+        if original_width <= width:
+            return gray
+        return cv2.resize(gray, (width, max(1, int(height * width / original_width))),
+                          interpolation=cv2.INTER_AREA)
+
+    def sharpness(self, gray: np.ndarray) -> float:
+        """Variance Laplacian (semakin besar semakin tajam)"""
+        return float(cv2.Laplacian(self._resize_width(gray, self.sharpness_width), cv2.CV_64F).var())
+
+    def check(self, frame: np.ndarray) -> str:
+        """
+        Evaluasi satu frame
+        Returns: 'accept', 'motion', 'blur', atau 'duplicate'
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thumb = self._resize_width(gray, self.thumb_width).astype(np.int16)
+
+        previous = self._previous_thumb
+        self._previous_thumb = thumb
+        if previous is None or previous.shape != thumb.shape:
+            self._stable_count = 1
+        elif float(np.abs(thumb - previous).mean()) > self.diff_threshold:
+            self._stable_count = 0
+            return 'motion'
+        else:
+            self._stable_count += 1
+
+        if self._stable_count < self.stable_frames:
+            return 'motion'
+
+        sharpness = self.sharpness(gray)
+        if sharpness < self.sharpness_threshold:
+            return 'blur'
+
+        accepted = self._accepted_thumb
+        if (accepted is not None and accepted.shape == thumb.shape
+                and float(np.abs(thumb - accepted).mean()) < self.duplicate_threshold
+                and sharpness < self._accepted_sharpness * 1.5):
+            return 'duplicate'
+
+        self._candidate = (thumb, sharpness)
+        return 'accept'
+
+    def commit(self):
+        """Catat frame 'accept' terakhir sebagai sudah di-OCR (pembanding duplicate berikutnya)"""
+        if self._candidate is not None:
+            self._accepted_thumb, self._accepted_sharpness = self._candidate
+            self._candidate = None
+
+def _text_tokens(text: str) -> Set[str]:
+    return {token for token in re.findall(r'[a-z0-9]+', text.lower()) if len(token) >= 3}
+
+class LabelTextAccumulator:
+    """Gabungkan baris OCR dari beberapa frame untuk satu label (tanpa duplikat)"""
+
+    def __init__(self, start_frame: int):
+        self.start_frame = start_frame
+        self.end_frame = start_frame
+        self.frames_ocr = 0
+        self.tokens: Set[str] = set()
+        self._lines: List[str] = []
+        self._keys: List[str] = []
+
+    def overlap(self, tokens: Set[str]) -> float:
+        """Proporsi token yang sama (relatif ke himpunan yang lebih kecil)"""
+        if not tokens or not self.tokens:
+            return 0.0
+        return len(tokens & self.tokens) / min(len(tokens), len(self.tokens))
+
+    def add(self, frame_index: int, text: str):
+        self.end_frame = frame_index
+        self.frames_ocr += 1
+        self.tokens |= _text_tokens(text)
+        for line in text.splitlines():
+            line = line.strip()
+            key = re.sub(r'[^a-z0-9]', '', line.lower())
+            if len(key) < 3:
+                continue
+            # Baris yang sama (atau potongannya) dari frame lain: simpan versi terlengkap
+            for i, existing in enumerate(self._keys):
+                if key in existing:
+                    break
+                if existing in key:
+                    self._keys[i] = key
+                    self._lines[i] = line
+                    break
+            else:
+                self._keys.append(key)
+                self._lines.append(line)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self._lines)
+
+class VideoLabelScanner:
+    """Scan label dari stream frame: gate -> OCR di background -> gabung per label -> analisis"""
+
+    def __init__(self, image_processor: Optional[ImageProcessor] = None,
+                 analyzer: Optional[IngredientAnalyzer] = None, gate: Optional[FrameGate] = None,
+                 min_text_overlap: float = 0.3, max_pending: int = 2):
+        self.image_processor = image_processor or ImageProcessor()
+        self.analyzer = analyzer or IngredientAnalyzer()
+        self.gate = gate or FrameGate()
+        self.min_text_overlap = min_text_overlap
+        self.max_pending = max_pending
+        self.stats = {}
+
+    def _ocr_frame(self, frame: np.ndarray) -> str:
+        with METRICS.timer('video_frame_ocr'):
+            return self.image_processor.extract_text(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def _count(self, reason: str):
+        self.stats[reason] = self.stats.get(reason, 0) + 1
+        METRICS.inc('video_frames', reason)
+
+    def _finish_label(self, label: LabelTextAccumulator, label_index: int) -> Dict:
+        text = label.text
+        analysis = self.analyzer.analyze_ingredients(text)
+        return {
+            'label_index': label_index,
+            'start_frame': label.start_frame,
+            'end_frame': label.end_frame,
+            'frames_ocr': label.frames_ocr,
+            'extracted_text': text,
+            'analysis': analysis,
+            'recommendation': self.analyzer.get_recommendation(analysis)
+        }
+
+    def scan_frames(self, frames: Iterable[np.ndarray], drop_when_busy: bool = False) -> Iterator[Dict]:
+        """
+        Scan urutan frame BGR
+        drop_when_busy=True (kamera live): frame dibuang jika worker OCR masih penuh;
+        False (file video): tunggu worker agar hasil deterministik
+        Yields: hasil analisis per label, berurutan
+        """
+        self.gate.reset()
+        self.stats = {}
+        pending = deque()
+        state = {'label': None, 'index': 0}
+
+        def collect(frame_index: int, text: str) -> Optional[Dict]:
+            tokens = _text_tokens(text)
+            if not tokens:
+                self._count('no_text')
+                return None
+            finished = None
+            label = state['label']
+            # Teks tidak nyambung dengan label sebelumnya: dianggap produk baru
+            if label is not None and label.overlap(tokens) < self.min_text_overlap:
+                finished = self._finish_label(label, state['index'])
+                state['index'] += 1
+                label = None
+            if label is None:
+                label = state['label'] = LabelTextAccumulator(frame_index)
+            label.add(frame_index, text)
+            return finished
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for frame_index, frame in enumerate(frames):
+                self._count('read')
+                decision = self.gate.check(frame)
+                if decision != 'accept':
+                    self._count(decision)
+                    continue
+
+                # Ambil hasil OCR yang sudah selesai (urutan tetap)
+                while pending and pending[0][1].done():
+                    done_index, future = pending.popleft()
+                    finished = collect(done_index, future.result())
+                    if finished is not None:
+                        yield finished
+
+                if len(pending) >= self.max_pending:
+                    if drop_when_busy:
+                        # Tidak di-commit: frame berikutnya dari label yang sama masih bisa di-OCR
+                        self._count('dropped')
+                        continue
+                    done_index, future = pending.popleft()
+                    finished = collect(done_index, future.result())
+                    if finished is not None:
+                        yield finished
+
+                self._count('ocr')
+                pending.append((frame_index, executor.submit(self._ocr_frame, frame.copy())))
+                self.gate.commit()
+
+            while pending:
+                done_index, future = pending.popleft()
+                finished = collect(done_index, future.result())
+                if finished is not None:
+                    yield finished
+
+        if state['label'] is not None:
+            yield self._finish_label(state['label'], state['index'])
+
+    def scan(self, source: Union[str, int], drop_when_busy: Optional[bool] = None) -> Iterator[Dict]:
+        """
+        Scan dari file video (path) atau device kamera (index)
+        drop_when_busy default: True untuk kamera, False untuk file
+        """
+        capture = cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise RuntimeError(f"Tidak dapat membuka sumber video: {source}")
+        if drop_when_busy is None:
+            drop_when_busy = isinstance(source, int)
+
+        def read_frames() -> Iterator[np.ndarray]:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield frame
+
+        try:
+            yield from self.scan_frames(read_frames(), drop_when_busy=drop_when_busy)
+        finally:
+            capture.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan label produk dari video atau kamera")
+    parser.add_argument('video', nargs='?', help="File video (kosongkan jika memakai --device)")
+    parser.add_argument('--device', type=int, default=None, help="Index device kamera")
+    parser.add_argument('--output', default=None, help="Simpan hasil per label ke file JSONL")
+    parser.add_argument('--diff-threshold', type=float, default=6.0)
+    parser.add_argument('--sharpness-threshold', type=float, default=60.0)
+    parser.add_argument('--stable-frames', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.video is None and args.device is None:
+        parser.error("Berikan file video atau --device")
+    source = args.device if args.device is not None else args.video
+
+    scanner = VideoLabelScanner(gate=FrameGate(diff_threshold=args.diff_threshold,
+                                               sharpness_threshold=args.sharpness_threshold,
+                                               stable_frames=args.stable_frames))
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        for result in scanner.scan(source):
+            recommendation = result['recommendation']
+            print(f"Label #{result['label_index'] + 1} (frame {result['start_frame']}-{result['end_frame']}, "
+                  f"{result['frames_ocr']} OCR): {recommendation['status']} - {recommendation['message']}")
+            if output is not None:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nScan dihentikan")
+    finally:
+        if output is not None:
+            output.close()
+    print(f"Statistik frame: {scanner.stats}")
+
+if __name__ == "__main__":
+    main()